@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+from datetime import date as date_cls
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ledger import file_tail, parse_sale
+from metrics import timed
+from records import SalesTable
+from store import gc_paused
+
+COLUMNS = (("dates", "int32"), ("name_ids", "int32"), ("qty", "int64"), ("profit", "float64"), ("revenue", "float64"))
+ITEM_SORTS = ("qty", "profit", "revenue", "margin")
+
+def available():
+    return np is not None
+
+def ordinal(day):
+    return date_cls.fromisoformat(day).toordinal()
+
+class SalesAnalytics:
+    """Sales history as NumPy columns, for group-by reports over the whole file.
+
+    Like the ledger, only bytes appended since the last refresh are parsed.
+    The columns are cached as .npy files in cache_dir and memory-mapped on
+    start, so a new worker does not re-parse years of sales. Rows read since
+    go into tail buffers that double in size as they fill, so a refresh
+    costs the new rows rather than a copy of the history, and the mapped
+    part stays shared between workers. Each cache write maps the columns
+    again from the new files.
+    """
+
+    CACHE_VERSION = 2
+
+    # Rewrite the cache at most once per this many newly read bytes
+    CACHE_EVERY = 1024 * 1024
+    # Rows the tail buffers start with
+    TAIL_ROWS = 1024
+
+    def __init__(self, path, cache_dir=None, archive=None):
+        if np is None:
+            raise RuntimeError("numpy is required for sales analytics")
+        self.path = path
+        self.cache_dir = cache_dir
+        self.archive = archive
+        self._reset()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _reset(self, inode=None):
+        self.offset = 0
+        self._mapped = {name: np.empty(0, dtype) for name, dtype in COLUMNS}
+        self._clear_tail()
+        self.names = []
+        self._name_ids = {}
+        self._inode = inode
+        self._archived_through = ""
+        self._cached_at = 0
+
+    def _clear_tail(self):
+        self._tail = {name: np.empty(0, dtype) for name, dtype in COLUMNS}
+        self._tail_rows = 0
+
+    def _parts(self):
+        """The mapped columns and the filled part of the tail buffers. Later appends leave both as they are."""
+        rows = self._tail_rows
+        return [self._mapped, {name: column[:rows] for name, column in self._tail.items()}]
+
+    def _rows(self):
+        return len(self._mapped["dates"]) + self._tail_rows
+
+    def _load_archive(self):
+        if not self.archive:
+            return
+        self._archived_through = self.archive.compacted_through()
+        with gc_paused():
+            for table in self.archive.tables():
+                self._append(table)
+
+    def _name_id(self, name):
+        i = self._name_ids.get(name)
+        if i is None:
+            i = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def _load_cache(self, st):
+        try:
+            with open(os.path.join(self.cache_dir, "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if meta.get("version") != self.CACHE_VERSION:
+            return
+        if meta.get("inode") != st.st_ino or meta.get("offset", 0) > st.st_size:
+            return
+        with open(self.path, "rb") as f:
+            if file_tail(f, meta["offset"]) != meta.get("tail"):
+                return
+        rows = meta["rows"]
+        columns = {}
+        for name, _ in COLUMNS:
+            try:
+                column = np.load(os.path.join(self.cache_dir, f"{name}.npy"), mmap_mode="r")
+            except (FileNotFoundError, ValueError):
+                return
+            # Another worker may have written longer columns after this meta; they only ever grow
+            if len(column) < rows:
+                return
+            columns[name] = column[:rows]
+        self.offset = meta["offset"]
+        self._mapped = columns
+        self._clear_tail()
+        self.names = meta["names"]
+        self._name_ids = {name: i for i, name in enumerate(self.names)}
+        self._inode = st.st_ino
+        self._archived_through = meta.get("archived_through", "")
+        self._cached_at = self.offset
+
+    def _save_cache(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.path, "rb") as f:
+            tail = file_tail(f, self.offset)
+        rows = self._rows()
+        mapped = {}
+        # Columns first, then the meta that says how many of their rows are valid
+        for name, dtype in COLUMNS:
+            tmp = os.path.join(self.cache_dir, f"{name}.{os.getpid()}.tmp.npy")
+            path = os.path.join(self.cache_dir, f"{name}.npy")
+            # Filled part by part on disk rather than joined in memory first
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(rows,))
+            start = 0
+            for part in self._parts():
+                out[start:start + len(part[name])] = part[name]
+                start += len(part[name])
+            out.flush()
+            del out
+            os.replace(tmp, path)
+            mapped[name] = np.load(path, mmap_mode="r")[:rows]
+        self._mapped = mapped
+        self._clear_tail()
+        meta = {
+            "version": self.CACHE_VERSION, "inode": self._inode, "offset": self.offset,
+            "tail": tail, "rows": rows, "names": self.names,
+            "archived_through": self._archived_through
+        }
+        tmp = os.path.join(self.cache_dir, f"meta.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.cache_dir, "meta.json"))
+        self._cached_at = self.offset
+
+    def _append(self, table):
+        ids = np.array([self._name_id(name) for name in table.names], dtype="int32")
+        new = {
+            "dates": np.asarray(table.dates, dtype="int32"),
+            "name_ids": ids[np.asarray(table.name_ids, dtype="int64")] if len(table) else np.empty(0, "int32"),
+            "qty": np.asarray(table.qty, dtype="int64"),
+            "profit": np.asarray(table.profit, dtype="float64"),
+            "revenue": np.asarray(table.revenue, dtype="float64")
+        }
+        start = self._tail_rows
+        end = start + len(table)
+        if end > len(self._tail["dates"]):
+            # Doubling keeps the copying to about one per row over the life of the buffers
+            size = max(2 * len(self._tail["dates"]), end, self.TAIL_ROWS)
+            for name, dtype in COLUMNS:
+                grown = np.empty(size, dtype)
+                grown[:start] = self._tail[name][:start]
+                self._tail[name] = grown
+        for name, _ in COLUMNS:
+            self._tail[name][start:end] = new[name]
+        self._tail_rows = end
+
+    @timed("refresh_analytics")
+    def refresh(self):
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return
+            if not self._started:
+                self._started = True
+                if self.cache_dir:
+                    self._load_cache(st)
+            if st.st_ino != self._inode or st.st_size < self.offset:
+                # Replaced (as compaction does) or truncated: start over from the archive
+                self._reset(st.st_ino)
+                self._load_archive()
+            if st.st_size == self.offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(st.st_size - self.offset)
+            # Leave a half-written last line for the next refresh
+            end = data.rfind(b"\n") + 1
+            table = SalesTable()
+            with gc_paused():
+                for line in data[:end].decode("utf-8").splitlines():
+                    sale = parse_sale(line)
+                    if sale and sale.date > self._archived_through:
+                        table.append(sale)
+            self._append(table)
+            self.offset += end
+            if self.cache_dir and self.offset - self._cached_at >= self.CACHE_EVERY:
+                self._save_cache()
+
+    def checkpoint(self):
+        """Write the column cache now if it is behind the sales file."""
+        self.refresh()
+        with self._lock:
+            if self.cache_dir and self._inode is not None and self.offset != self._cached_at:
+                self._save_cache()
+
+    def _select(self, start=None, end=None):
+        self.refresh()
+        with self._lock:
+            parts, names = self._parts(), list(self.names)
+        masks = []
+        for part in parts:
+            dates = part["dates"]
+            mask = np.ones(len(dates), dtype=bool)
+            if start:
+                mask &= dates >= ordinal(start)
+            if end:
+                mask &= dates <= ordinal(end)
+            masks.append(mask)
+        return {
+            name: np.concatenate([part[name][mask] for part, mask in zip(parts, masks)]) for name, _ in COLUMNS
+        }, names
+
+    @timed("analyse_by_date")
+    def by_date(self, start=None, end=None):
+        """Totals per date in [start, end], oldest first."""
+        rows, _ = self._select(start, end)
+        days, index = np.unique(rows["dates"], return_inverse=True)
+        qty = np.bincount(index, weights=rows["qty"], minlength=len(days))
+        profit = np.bincount(index, weights=rows["profit"], minlength=len(days))
+        revenue = np.bincount(index, weights=rows["revenue"], minlength=len(days))
+        return [
+            {"date": date_cls.fromordinal(int(d)).isoformat(), "qty": int(q), "profit": float(p), "revenue": float(r)}
+            for d, q, p, r in zip(days, qty, profit, revenue)
+        ]
+
+    @timed("analyse_by_item")
+    def by_item(self, start=None, end=None, sort="qty", limit=None):
+        """Totals and margin per item in [start, end], largest first by sort.
+
+        sort="qty" gives the top sellers; margin is profit over revenue and
+        is None for items sold without a recorded revenue.
+        """
+        rows, names = self._select(start, end)
+        ids = rows["name_ids"]
+        qty = np.bincount(ids, weights=rows["qty"], minlength=len(names))
+        profit = np.bincount(ids, weights=rows["profit"], minlength=len(names))
+        revenue = np.bincount(ids, weights=rows["revenue"], minlength=len(names))
+        counts = np.bincount(ids, minlength=len(names))
+        margin = np.divide(profit, revenue, out=np.full(len(names), np.nan), where=revenue > 0)
+        key = {"qty": qty, "profit": profit, "revenue": revenue, "margin": margin}[sort]
+        sold = np.flatnonzero(counts)
+        # Stable sort on the negated key keeps ties in name-id order; NaN margins sort last
+        order = sold[np.argsort(-np.nan_to_num(key[sold], nan=-np.inf), kind="stable")]
+        if limit is not None:
+            order = order[:limit]
+        return [
+            {
+                "name": names[i], "qty": int(qty[i]), "profit": float(profit[i]), "revenue": float(revenue[i]),
+                "margin": None if np.isnan(margin[i]) else float(margin[i])
+            }
+            for i in order
+        ]
+
+    def stats(self):
+        return {
+            "pid": os.getpid(), "offset": self.offset, "rows": self._rows(),
+            "items": len(self.names), "mapped": isinstance(self._mapped["dates"], np.memmap),
+            "mapped_rows": len(self._mapped["dates"]), "tail_rows": self._tail_rows
+        }
@@ -1,666 +1,724 @@
-from flask import Flask, render_template_string, request, redirect, url_for
-from datetime import datetime
-import csv
+from flask import Flask, Response, abort, g, has_request_context, render_template, make_response, request, redirect, stream_with_context, url_for, jsonify
+from werkzeug.http import is_resource_modified
+from flask.json.provider import DefaultJSONProvider
+from datetime import datetime, timezone
+import hashlib
+import json
+from itertools import islice
+import os
+
+from analytics import ITEM_SORTS as ANALYTICS_SORTS
+from branches import MAIN, BranchPrefix, Branches
+from catalog import MedicineCatalog
+from csvio import item_rows, read_items_csv, sale_rows
+from forecast import BackgroundJob
+from ledger import GROUPS
+from metrics import ProfileOnRequest, instrument, render as render_metrics, timed
+from records import DEFAULT_REORDER_LEVEL, Item, Sale
+from store import checked_expiry, clean_lot, stat_stamp
+
+class InventoryJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        # Items list their batches even when the store keeps a single one implicit
+        if isinstance(o, Item):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
+app.json = InventoryJSONProvider(app)
+# Static assets are versioned by mtime in their URL, so they can be cached for good
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 365 * 24 * 3600
 ITEMS_FILE = "items.txt"
 SALES_FILE = "sales.txt"
+MEDICINES_FILE = "medicines.csv"
+EXPIRY_WARNING_DAYS = 30
+# The furthest ahead /api/items/expiring looks; dates much further out overflow
+MAX_EXPIRY_DAYS = 3650
+# How long an idle alert stream waits before checking for other workers' changes
+ALERT_POLL_SECONDS = 2
+ALERT_KEEPALIVE_SECONDS = 15
+# Branches other than main keep their own ITEMS_FILE and SALES_FILE in BRANCHES_DIR/<id>/
+BRANCHES_DIR = "branches"
+# cProfile for requests sent with X-Profile: 1 or ?profile=1; off unless enabled here
+PROFILE_REQUESTS = os.environ.get("INVENTORY_PROFILING") == "1"
+PROFILE_DIR = os.environ.get("INVENTORY_PROFILE_DIR")
+# Sales are group-committed: one write and fsync per batch. A flush interval
+# above zero holds a batch back that long for more sales to join it
+SALES_FLUSH_INTERVAL = float(os.environ.get("INVENTORY_SALES_FLUSH_INTERVAL", "0"))
+SALES_BATCH_SIZE = int(os.environ.get("INVENTORY_SALES_BATCH_SIZE", "256"))
+# Seconds between reorder forecast runs; one worker runs each, the rest read its result
+FORECAST_INTERVAL = int(os.environ.get("INVENTORY_FORECAST_INTERVAL", "300"))
+
+instrument(app)
+app.wsgi_app = BranchPrefix(app.wsgi_app)
+if PROFILE_REQUESTS:
+    app.wsgi_app = ProfileOnRequest(app.wsgi_app, PROFILE_DIR)
+
+branches = Branches(
+    BRANCHES_DIR, items_file=ITEMS_FILE, sales_file=SALES_FILE,
+    flush_interval=SALES_FLUSH_INTERVAL, batch_size=SALES_BATCH_SIZE, forecast_interval=FORECAST_INTERVAL
+)
+medicine_catalog = MedicineCatalog(MEDICINES_FILE)
+forecast_job = BackgroundJob(
+    lambda: [each.forecast.refresh() for each in branches.all()], FORECAST_INTERVAL, name="reorder-forecast"
+)
+
+def branch():
+    """The branch this request is for: /b/<id>/ in the URL, else an X-Branch header, else main.
+
+    Outside a request (scripts, warm-up) it is main.
+    """
+    if not has_request_context():
+        return branches.get(MAIN)
+    current = g.get("branch")
+    if current is None:
+        id = request.environ.get("inventory.branch") or request.headers.get("X-Branch") or MAIN
+        current = branches.get(id)
+        if current is None:
+            abort(404, f"No branch called {id}")
+        g.branch = current
+    return current
 
+@timed("load_items")
 def load_items():
-    items = []
-    try:
-        with open(ITEMS_FILE, "r") as f:
-            for line in f:
-                parts = line.strip().split(",")
-                # Support old files without expiry
-                if len(parts) == 5:
-                    name, stock, original_price, sale_price, expiry = parts
-                else:
-                    name, stock, original_price, sale_price = parts
-                    expiry = ""
-                items.append({
-                    "name": name,
-                    "stock": int(stock),
-                    "original_price": float(original_price),
-                    "sale_price": float(sale_price),
-                    "expiry": expiry
-                })
-    except FileNotFoundError:
-        pass
-    return items
-
-def save_items(items):
-    with open(ITEMS_FILE, "w") as f:
-        for item in items:
-            expiry = item.get("expiry", "")
-            f.write(
-                f"{item['name']},{item['stock']},{item['original_price']},{item['sale_price']},{expiry}\n"
-            )
-
-def record_sale(name, quantity, profit):
+    return branch().items.load()
+
+def new_sale(item, qty, now):
+    profit = (item.sale_price - item.original_price) * qty
+    return Sale(now, item.name, qty, profit, item.sale_price * qty)
+
+@timed("record_sales")
+def record_sales(count):
+    """Have count sales just logged with their stock copied to the sales file.
+
+    The sales are already durable in the items log, so callers don't wait:
+    the writer copies them over in its next batch, retrying from the log if
+    a write fails, and the day summary counts them from the log meanwhile.
+    """
+    branch().writer.submit(count)
+
+def checkout(lines):
+    """Sell a basket of (name, qty) lines, all or nothing. Returns (sales, errors)."""
+    store = branch().items
     now = datetime.now().strftime("%Y-%m-%d")
-    with open(SALES_FILE, "a") as f:
-        f.write(f"{now},{name},{quantity},{profit}\n")
+    with store.locked():
+        taken, errors = store.take_stock_many(lines, lambda item, qty: new_sale(item, qty, now))
+        if errors:
+            return None, errors
+        sales = [new_sale(item, qty, now) for item, qty in taken]
+    record_sales(len(sales))
+    return sales, []
 
-def load_sales():
-    sales = []
-    try:
-        with open(SALES_FILE, "r") as f:
-            for line in f:
-                stripped_line = line.strip()
-                if stripped_line:
-                    parts = stripped_line.split(",")
-                    if len(parts) == 4:
-                        date, name, qty, profit = parts
-                        sales.append({
-                            "date": date,
-                            "name": name,
-                            "qty": int(qty),
-                            "profit": float(profit)
-                        })
-    except FileNotFoundError:
-        pass
-    return sales
-
-def load_all_medicines():
-    medicines = []
-    try:
-        with open("medicines.csv", "r", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            next(reader)  # Skip header
-            for row in reader:
-                if len(row) > 1 and row[1].strip():
-                    medicines.append(row[1].strip())
-    except FileNotFoundError:
-        pass
-    return medicines
+def warm_up():
+    """Load every data file and compile the templates ahead of the first request.
+
+    gunicorn.conf.py runs this once in the master with preload_app, so forked
+    workers start with everything built and share it copy-on-write. It also
+    brings every branch's sales checkpoint and column cache up to date, so a process
+    that does start cold loads those instead of re-parsing sales.txt.
+    """
+    for each in branches.all():
+        each.warm_up()
+    medicine_catalog.names()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+@app.before_request
+def start_background_jobs():
+    forecast_job.start()
+
+@app.context_processor
+def asset_helpers():
+    return {"asset_url": asset_url}
+
+def asset_url(filename):
+    mtime = os.path.getmtime(os.path.join(app.static_folder, filename))
+    return url_for("static", filename=filename, v=int(mtime))
+
+def data_version():
+    """ETag and Last-Modified for pages built from the branch's item and sales files."""
+    current = branch()
+    today = datetime.now().strftime("%Y-%m-%d")
+    parts = (current.id, current.items.version(), current.ledger.version(), current.forecast.version(), today)
+    etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+    stamps = [stat_stamp(p) for p in (current.items_file, current.items.wal_path, current.sales_file)]
+    mtimes = [s[0] for s in stamps if s]
+    last_modified = datetime.fromtimestamp(max(mtimes) / 1e9, timezone.utc) if mtimes else None
+    return etag, last_modified
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Browsers always revalidate; an unchanged page comes back as an empty 304
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag, last_modified):
+    if is_resource_modified(request.environ, etag, last_modified=last_modified):
+        return None
+    return with_validators(app.response_class(status=304), etag, last_modified)
 
 @app.route("/")
 def index():
-    items = load_items()
-    sales = load_sales()
-    all_medicines = load_all_medicines()
+    etag, last_modified = data_version()
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
 
     today = datetime.now().strftime("%Y-%m-%d")
-    today_profit = 0
-    sold_count = {}
-
-    # Low stock notification (<10)
-    low_stock_items = [item for item in items if item["stock"] < 10]
-
-    for sale in sales:
-        if sale["date"] == today:
-            today_profit += sale["profit"]
-            if sale["name"] not in sold_count:
-                sold_count[sale["name"]] = 0
-            sold_count[sale["name"]] += sale["qty"]
-
-    return render_template_string("""
-    <html>
-    <head>
-        <title>Simple Inventory System</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1, viewport-fit=cover">
-        <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { 
-                font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif; 
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                padding: 20px;
-            }
-            .container { max-width: 1200px; margin: 0 auto; }
-            h1 { 
-                color: black; /* Changed from white to black */
-                text-align: center; 
-                font-size: 2.5rem; 
-                font-weight: 700; 
-                margin-bottom: 30px; 
-                text-shadow: 0 2px 4px rgba(0,0,0,0.03);
-            }
-            .dashboard { display: grid; grid-template-columns: repeat(auto-fit, minmax(350px, 1fr)); gap: 25px; }
-            .card { 
-                background: white; 
-                padding: 25px; 
-                border-radius: 15px; 
-                box-shadow: 0 8px 25px rgba(0,0,0,0.1); 
-                border: 1px solid rgba(255,255,255,0.2);
-                backdrop-filter: blur(10px);
-                transition: transform 0.3s ease, box-shadow 0.3s ease;
-            }
-            .card:hover { transform: translateY(-5px); box-shadow: 0 15px 35px rgba(0,0,0,0.15); }
-            .card h2 { 
-                color: #2d3748; 
-                font-size: 1.4rem; 
-                font-weight: 600; 
-                margin-bottom: 20px; 
-                display: flex; 
-                align-items: center; 
-                gap: 10px;
-            }
-            .profit-card { background: linear-gradient(135deg, #8f5be8, #764ba2); color: white; }
-            .profit-card h2 { color: white; }
-            .profit-amount { font-size: 2.5rem; font-weight: 700; margin: 15px 0; }
-            .inventory-item { 
-                display: flex; 
-                justify-content: space-between; 
-                align-items: center; 
-                padding: 15px; 
-                margin: 10px 0; 
-                background: #f7fafc; 
-                border-radius: 10px; 
-                border-left: 4px solid #4299e1;
-            }
-            .item-name { font-weight: 600; color: #2d3748; }
-            .item-details { font-size: 0.9rem; color: #718096; }
-            .form-group { margin-bottom: 15px; }
-            .form-group label { display: block; margin-bottom: 5px; font-weight: 500; color: #4a5568; }
-            input { 
-                width: 100%; 
-                padding: 12px 15px; 
-                border: 2px solid #e2e8f0; 
-                border-radius: 8px; 
-                font-size: 1rem;
-                transition: border-color 0.3s ease, box-shadow 0.3s ease;
-                background: white;
-            }
-            input:focus { 
-                outline: none; 
-                border-color: #4299e1; 
-                box-shadow: 0 0 0 3px rgba(66, 153, 225, 0.1);
-            }
-            button { 
-                background: linear-gradient(135deg, #4299e1, #3182ce); 
-                color: white; 
-                border: none; 
-                padding: 12px 20px; 
-                width: 100%; 
-                border-radius: 8px; 
-                font-size: 1rem; 
-                font-weight: 600; 
-                cursor: pointer;
-                transition: all 0.3s ease;
-            }
-            button:hover { 
-                background: linear-gradient(135deg, #3182ce, #2c5aa0); 
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(66, 153, 225, 0.3);
-            }
-            .sold-item { 
-                display: flex; 
-                justify-content: space-between; 
-                padding: 10px 15px; 
-                background: rgba(255,255,255,0.9); 
-                border-radius: 8px; 
-                margin: 8px 0;
-            }
-            .icon { font-size: 1.2rem; }
-            ul { list-style: none; }
-            .no-items { 
-                text-align: center; 
-                padding: 30px; 
-                color: #718096; 
-                font-style: italic;
-            }
-            .edit-btn, .delete-btn {
-                width: auto;
-                display: inline-block;
-                margin-left: 5px;
-                margin-top: 5px;
-                padding: 6px 12px;
-                font-size: 0.9rem;
-                border-radius: 6px;
-            }
-            .edit-btn { background: #ecc94b; color: #2d3748; }
-            .edit-btn:hover { background: #f6e05e; }
-            .delete-btn { background: #e53e3e; color: white; }
-            .delete-btn:hover { background: #c53030; }
-            .toggle-section { display: none; }
-            .toggle-section.active { display: block; }
-            .tabbar {
-                position: fixed;
-                bottom: 0;
-                left: 0;
-                width: 100vw;
-                background: #fff;
-                border-top: 1.5px solid #e2e8f0;
-                display: flex;
-                justify-content: space-around;
-                align-items: center;
-                z-index: 100;
-                height: 62px;
-                box-shadow: 0 -2px 16px rgba(0,0,0,0.07);
-            }
-            .tabbar-btn {
-                flex: 1;
-                text-align: center;
-                padding: 7px 0 0 0;
-                color: #4a5568;
-                font-size: 1.1rem;
-                background: none;
-                border: none;
-                outline: none;
-                font-family: inherit;
-                transition: color 0.2s;
-                cursor: pointer;
-            }
-            .tabbar-btn.active {
-                color: #764ba2;
-                font-weight: 700;
-            }
-            .tabbar-btn .icon {
-                display: block;
-                font-size: 1.5rem;
-                margin-bottom: 2px;
-            }
-            /* Horizontal scroll for inventory table */
-            #inventory-table-wrapper {
-                overflow-x: auto;
-                width: 100%;
-            }
-            #inventory-table {
-                min-width: 600px;
-            }
-            @media (min-width: 769px) {
-                .tabbar { display: none; }
-            }
-            @media (max-width: 768px) {
-                body { padding-bottom: 90px !important; }
-            }
-        </style>
-        <script>
-            function showSection(id) {
-                document.querySelectorAll('.toggle-section').forEach(function(sec) {
-                    sec.classList.remove('active');
-                });
-                document.querySelectorAll('.toggle-btn').forEach(function(btn) {
-                    btn.classList.remove('active');
-                });
-                document.querySelectorAll('.tabbar-btn').forEach(function(btn) {
-                    btn.classList.remove('active');
-                });
-                document.getElementById(id).classList.add('active');
-                var btn = document.getElementById('btn-' + id);
-                if (btn) btn.classList.add('active');
-                var tabBtn = document.getElementById('tab-' + id);
-                if (tabBtn) tabBtn.classList.add('active');
-            }
-            window.onload = function() {
-                showSection('inventory');
-            }
-        </script>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Inventory Management 🗂️</h1>
-            {% if low_stock_items %}
-                <div style="background:#fff3cd;color:#856404;padding:16px;border-radius:8px;margin-bottom:20px;border:1px solid #ffeeba;">
-                    <strong>⚠️ Low Stock Alert:</strong>
-                    {% for item in low_stock_items %}
-                        <span>{{ item.name }} ({{ item.stock }} left)</span>{% if not loop.last %}, {% endif %}
-                    {% endfor %}
-                </div>
-            {% endif %}
-
-            <div class="card profit-card" style="margin-bottom: 30px;">
-                <h2><span class="icon">💰</span>Today's Performance</h2>
-                <div class="profit-amount">MMK{{ today_profit|int }}</div>
-                {% if sold_count %}
-                    <h3 style="margin-top: 20px; margin-bottom: 15px; color: black;">Items Sold Today:</h3>
-                    {% for name, qty in sold_count.items() %}
-                        <div class="sold-item" style="color: black;">
-                            <span>{{ name }}</span>
-                            <span><strong>{{ qty }} sold</strong></span>
-                        </div>
-                    {% endfor %}
-                {% else %}
-                    <div class="no-items">No sales recorded today</div>
-                {% endif %}
-            </div>
-
-            <div id="inventory" class="card toggle-section">
-                <h2><span class="icon">📦</span>Current Inventory</h2>
-                <input type="text" id="inventory-search" placeholder="Search item..." style="margin-bottom:15px;width:100%;padding:10px;border-radius:6px;border:1.5px solid #e2e8f0;">
-                <div id="inventory-table-wrapper">
-                {% if items %}
-                    <table id="inventory-table" style="width:100%;border-collapse:collapse;">
-                        <thead>
-                            <tr style="background:#f1f5f9;">
-                                <th style="text-align:left;padding:8px;">Name</th>
-                                <th style="text-align:right;padding:8px;">Stock</th>
-                                <th style="text-align:right;padding:8px;">Buy (MMK)</th>
-                                <th style="text-align:right;padding:8px;">Sell (MMK)</th>
-                                <th style="text-align:center;padding:8px;">Actions</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                        {% for item in items %}
-                            <tr>
-                                <td>{{ item.name }}</td>
-                                <td style="text-align:right;">{{ item.stock }}</td>
-                                <td style="text-align:right;">MMK{{ item.original_price|int }}</td>
-                                <td style="text-align:right;">MMK{{ item.sale_price|int }}</td>
-                                <td style="text-align:center;">
-                                    <form action="/delete/{{ item.name }}" method="post" style="display:inline;">
-                                        <button type="submit" class="delete-btn">Delete</button>
-                                    </form>
-                                    <a href="/edit/{{ item.name }}"><button type="button" class="edit-btn">Edit</button></a>
-                                </td>
-                            </tr>
-                        {% endfor %}
-                        </tbody>
-                    </table>
-                {% else %}
-                    <div class="no-items">No items in inventory</div>
-                {% endif %}
-                </div>
-            </div>
-            <script>
-            document.getElementById('inventory-search').addEventListener('input', function() {
-                var filter = this.value.toLowerCase();
-                document.querySelectorAll('#inventory-table tbody tr').forEach(function(row) {
-                    row.style.display = row.children[0].textContent.toLowerCase().includes(filter) ? '' : 'none';
-                });
-            });
-            </script>
-
-            <div id="add" class="card toggle-section">
-                <h2><span class="icon">➕</span>Add New Item</h2>
-                <form action="/add" method="post">
-                    <div class="form-group">
-                        <label for="name">Item Name</label>
-                        <select id="name-select" name="name_select" onchange="onMedicineSelect()" style="width:100%;padding:12px 15px;border:2px solid #e2e8f0;border-radius:8px;font-size:1rem;">
-                            <option value="">-- Select Medicine --</option>
-                            {% for med in all_medicines %}
-                                <option value="{{ med }}">{{ med }}</option>
-                            {% endfor %}
-                            <option value="__custom__">Other (Type manually)</option>
-                        </select>
-                        <input id="name" name="name" placeholder="Enter item name" style="margin-top:8px;" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="stock">Initial Stock</label>
-                        <input id="stock" name="stock" placeholder="Enter quantity" type="number" min="0" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="buy">Purchase Price (MMK)</label>
-                        <input id="buy" name="buy" placeholder="0.00" type="number" step="0.01" min="0" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="sell">Selling Price (MMK)</label>
-                        <input id="sell" name="sell" placeholder="0.00" type="number" step="0.01" min="0" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="expiry">Expiry Date (optional)</label>
-                        <input id="expiry" name="expiry" type="date">
-                    </div>
-                    <button type="submit">Add to Inventory</button>
-                </form>
-                <script>
-                function onMedicineSelect() {
-                    var sel = document.getElementById('name-select');
-                    var input = document.getElementById('name');
-                    if(sel.value && sel.value !== "__custom__") {
-                        input.value = sel.value;
-                        input.readOnly = true;
-                    } else if(sel.value === "__custom__") {
-                        input.value = "";
-                        input.readOnly = false;
-                        input.focus();
-                    } else {
-                        input.value = "";
-                        input.readOnly = false;
-                    }
-                }
-                </script>
-            </div>
-
-            <div id="sale" class="card toggle-section">
-                <h2><span class="icon">🛒</span>Process Sale</h2>
-                <form action="/sell" method="post">
-                    <div class="form-group">
-                        <label for="sell-name">Item Name</label>
-                        <select id="sell-name" name="name" required style="width:100%;padding:12px 15px;border:2px solid #e2e8f0;border-radius:8px;font-size:1rem;">
-                            <option value="">-- Select Item --</option>
-                            {% for item in items %}
-                                <option value="{{ item.name }}" data-price="{{ item.sale_price }}">{{ item.name }} (Stock: {{ item.stock }})</option>
-                            {% endfor %}
-                        </select>
-                    </div>
-                    <div class="form-group">
-                        <label for="qty">Quantity to Sell</label>
-                        <input id="qty" name="qty" placeholder="Enter quantity" type="number" min="1" required>
-                    </div>
-                    <div class="form-group">
-                        <label>Total Price (MMK)</label>
-                        <div id="total-price" style="font-weight:700;font-size:1.2rem;">MMK0</div>
-                    </div>
-                    <button type="submit">Complete Sale</button>
-                </form>
-                <script>
-                function updateTotalPrice() {
-                    var select = document.getElementById('sell-name');
-                    var qtyInput = document.getElementById('qty');
-                    var totalDiv = document.getElementById('total-price');
-                    if (!select || !qtyInput || !totalDiv) return;
-                    var qty = parseInt(qtyInput.value) || 0;
-                    var price = 0;
-                    if (select.value) {
-                        var selectedOption = select.options[select.selectedIndex];
-                        price = parseFloat(selectedOption.getAttribute('data-price')) || 0;
-                    }
-                    var total = qty * price;
-                    totalDiv.innerText = 'MMK' + total;
-                }
-                document.getElementById('sell-name').addEventListener('change', updateTotalPrice);
-                document.getElementById('qty').addEventListener('input', updateTotalPrice);
-                document.getElementById('qty').addEventListener('change', updateTotalPrice);
-                updateTotalPrice();
-                </script>
-            </div>
-        </div>
-        <!-- Bottom Tab Bar -->
-        <nav class="tabbar">
-            <button class="tabbar-btn" id="tab-inventory" onclick="showSection('inventory')">
-                <span class="icon">📦</span>
-                <span style="font-size:0.98rem;">Inventory</span>
-            </button>
-            <button class="tabbar-btn" id="tab-add" onclick="showSection('add')">
-                <span class="icon">➕</span>
-                <span style="font-size:0.98rem;">Add</span>
-            </button>
-            <button class="tabbar-btn" id="tab-sale" onclick="showSection('sale')">
-                <span class="icon">🛒</span>
-                <span style="font-size:0.98rem;">Sale</span>
-            </button>
-        </nav>
-        <script>
-    function updateTotalPrice() {
-        var select = document.getElementById('sell-name');
-        var qtyInput = document.getElementById('qty');
-        var totalDiv = document.getElementById('total-price');
-        if (!select || !qtyInput || !totalDiv) return;
-        var qty = parseInt(qtyInput.value) || 0;
-        var price = 0;
-        if (select.value) {
-            var selectedOption = select.options[select.selectedIndex];
-            price = parseFloat(selectedOption.getAttribute('data-price')) || 0;
-        }
-        var total = qty * price;
-        totalDiv.innerText = 'MMK' + total;
-    }
-
-    document.addEventListener('DOMContentLoaded', function() {
-        // Tab bar activation
-        document.querySelectorAll('.tabbar-btn').forEach(function(btn) {
-            btn.addEventListener('click', function() {
-                document.querySelectorAll('.tabbar-btn').forEach(function(b) {
-                    b.classList.remove('active');
-                });
-                btn.classList.add('active');
-            });
-        });
-        // Always update price on load and on input
-        var select = document.getElementById('sell-name');
-        var qtyInput = document.getElementById('qty');
-        if (select) select.addEventListener('change', updateTotalPrice);
-        if (qtyInput) qtyInput.addEventListener('input', updateTotalPrice);
-        updateTotalPrice();
-    });
-</script>
-<script>
-    // Request notification permission on page load
-    document.addEventListener('DOMContentLoaded', function() {
-        if ("Notification" in window && Notification.permission !== "granted") {
-            Notification.requestPermission();
-        }
-        // If there are low stock items, show a notification
-        {% if low_stock_items %}
-        if ("Notification" in window && Notification.permission === "granted") {
-            new Notification("Low Stock Alert", {
-                body: "{% for item in low_stock_items %}{{ item.name }} ({{ item.stock }} left){% if not loop.last %}, {% endif %}{% endfor %}"
-            });
-        }
-        {% endif %}
-    });
-</script>
-    </body>
-    </html>
-    """,
-        items=items,
+    # Sales still on their way from the items log to the sales file are counted too
+    summary = branch().ledger.day(today, branch().items.pending_sales())
+    today_profit = summary["profit"]
+    sold_count = summary["qty"]
+
+    # Low stock notification, kept up to date by the store as stock moves
+    low_stock_items, _ = branch().items.low_stock()
+    expiring_batches = branch().items.expiring(EXPIRY_WARNING_DAYS)
+    # Computed by the background forecast job; empty until its first run
+    purchase_order = branch().forecast.purchase_order()
+
+    response = make_response(render_template(
+        "index.html",
         today_profit=today_profit,
         sold_count=sold_count,
         low_stock_items=low_stock_items,
-        all_medicines=all_medicines
-    )
+        expiring_batches=expiring_batches,
+        expiry_warning_days=EXPIRY_WARNING_DAYS,
+        purchase_order=purchase_order,
+        # Only the ASGI server holds alert streams without tying up a worker thread each
+        alert_stream=request.environ.get("inventory.alert_stream", False),
+        branch=branch().id
+    ))
+    return with_validators(response, etag, last_modified)
+
+def form_expiry():
+    try:
+        return checked_expiry(request.form.get("expiry"))
+    except ValueError:
+        abort(400)
 
 @app.route("/add", methods=["POST"])
 def add():
-    items = load_items()
-    items.append({
+    # Re-adding an existing name receives a new batch instead of creating a duplicate row
+    branch().items.add({
         "name": request.form["name"],
         "stock": int(request.form["stock"]),
         "original_price": float(request.form["buy"]),
         "sale_price": float(request.form["sell"]),
-        "expiry": request.form.get("expiry", "")
+        "expiry": form_expiry(),
+        "reorder_level": request.form.get("reorder_level", DEFAULT_REORDER_LEVEL, type=int),
+        "lot": clean_lot(request.form.get("lot"))
     })
-    save_items(items)
-    return redirect("/")
+    return redirect(url_for("index"))
 
 @app.route("/edit/<name>", methods=["GET", "POST"])
 def edit(name):
-    items = load_items()
-    item = next((i for i in items if i["name"].lower() == name.lower()), None)
+    item = branch().items.get(name)
     if not item:
-        return redirect("/")
+        return redirect(url_for("index"))
     if request.method == "POST":
-        item["name"] = request.form["name"]
-        item["stock"] = int(request.form["stock"])
-        item["original_price"] = float(request.form["buy"])
-        item["sale_price"] = float(request.form["sell"])
-        item["expiry"] = request.form.get("expiry", "")
-        save_items(items)
-        return redirect("/")
-    return render_template_string("""
-        <html>
-        <head>
-            <title>Edit Item</title>
-            <style>
-                body { font-family: 'Inter', sans-serif; background: #f7fafc; padding: 40px; }
-                .edit-form { max-width: 400px; margin: 0 auto; background: white; padding: 30px; border-radius: 12px; box-shadow: 0 4px 16px rgba(0,0,0,0.08);}
-                .form-group { margin-bottom: 18px; }
-                label { display: block; margin-bottom: 6px; font-weight: 500; color: #4a5568; }
-                input { width: 100%; padding: 10px 12px; border: 2px solid #e2e8f0; border-radius: 8px; font-size: 1rem; }
-                button { background: #4299e1; color: white; border: none; padding: 12px 20px; border-radius: 8px; font-size: 1rem; font-weight: 600; cursor: pointer; }
-                button:hover { background: #3182ce; }
-            </style>
-        </head>
-        <body>
-            <form class="edit-form" method="post">
-                <h2>Edit Item</h2>
-                <div class="form-group">
-                    <label for="name">Item Name</label>
-                    <input id="name" name="name" value="{{item.name}}" required>
-                </div>
-                <div class="form-group">
-                    <label for="stock">Stock</label>
-                    <input id="stock" name="stock" type="number" value="{{item.stock}}" required>
-                </div>
-                <div class="form-group">
-                    <label for="buy">Purchase Price (MMK)</label>
-                    <input id="buy" name="buy" type="number" step="0.01" value="{{item.original_price}}" required>
-                </div>
-                <div class="form-group">
-                    <label for="sell">Selling Price (MMK)</label>
-                    <input id="sell" name="sell" type="number" step="0.01" value="{{item.sale_price}}" required>
-                </div>
-                <div class="form-group">
-                    <label for="expiry">Expiry Date (optional)</label>
-                    <input id="expiry" name="expiry" type="date" value="{{item.expiry}}">
-                </div>
-                <button type="submit">Save</button>
-            </form>
-        </body>
-        </html>
-    """, item=item)
+        # A rename onto another item's name is refused rather than creating a duplicate
+        fields = {
+            "name": request.form["name"],
+            "stock": int(request.form["stock"]),
+            "original_price": float(request.form["buy"]),
+            "sale_price": float(request.form["sell"]),
+            "reorder_level": request.form.get("reorder_level", item.reorder_level, type=int)
+        }
+        if "expiry" in request.form:
+            fields["expiry"] = form_expiry()
+        try:
+            branch().items.update(name, fields)
+        except ValueError as e:
+            abort(400, str(e))
+        return redirect(url_for("index"))
+    etag, last_modified = data_version()
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+    return with_validators(make_response(render_template("edit.html", item=item)), etag, last_modified)
 
 @app.route("/delete/<name>", methods=["POST"])
 def delete(name):
     # Confirm deletion via POST parameter
     if request.form.get("confirm") == "yes":
-        items = load_items()
-        items = [i for i in items if i["name"].lower() != name.lower()]
-        save_items(items)
-        return redirect("/")
+        branch().items.delete(name)
+        return redirect(url_for("index"))
     else:
         # Show confirmation page
-        return render_template_string("""
-        <html>
-        <head>
-            <title>Confirm Delete</title>
-            <style>
-                body { font-family: 'Inter', sans-serif; background: #f7fafc; padding: 40px; }
-                .confirm-box { max-width: 400px; margin: 0 auto; background: white; padding: 30px; border-radius: 12px; box-shadow: 0 4px 16px rgba(0,0,0,0.08); text-align: center;}
-                button { background: #e53e3e; color: white; border: none; padding: 12px 20px; border-radius: 8px; font-size: 1rem; font-weight: 600; cursor: pointer; margin: 10px;}
-                button.cancel { background: #a0aec0; }
-            </style>
-        </head>
-        <body>
-            <div class="confirm-box">
-                <h2>Confirm Delete</h2>
-                <p>Are you sure you want to delete <strong>{{ name }}</strong> from stock?</p>
-                <form method="post">
-                    <input type="hidden" name="confirm" value="yes">
-                    <button type="submit">Yes, Delete</button>
-                    <a href="/"><button type="button" class="cancel">Cancel</button></a>
-                </form>
-            </div>
-        </body>
-        </html>
-        """, name=name)
+        return render_template("delete.html", name=name)
 
 @app.route("/sell", methods=["POST"])
 def sell():
     name = request.form["name"]
     qty = int(request.form["qty"])
-    items = load_items()
-
-    for item in items:
-        if item["name"].lower() == name.lower():
-            if item["stock"] >= qty:
-                item["stock"] -= qty
-                profit = (item["sale_price"] - item["original_price"]) * qty
-                record_sale(item["name"], qty, profit)
-                save_items(items)
-                break
-    return redirect("/")
+    now = datetime.now().strftime("%Y-%m-%d")
+    # The decrement and the sale go into one items-log record, so a crash can't keep one without the other
+    if branch().items.take_stock(name, qty, lambda item, qty: new_sale(item, qty, now)):
+        record_sales(1)
+    return redirect(url_for("index"))
+
+@app.route("/checkout", methods=["POST"])
+def checkout_form():
+    lines = []
+    for name, qty in zip(request.form.getlist("name"), request.form.getlist("qty")):
+        if name and qty:
+            lines.append((name, int(qty)))
+    checkout(lines)
+    return redirect(url_for("index"))
+
+@app.route("/api/checkout", methods=["POST"])
+def checkout_api():
+    body = request.get_json(silent=True) or {}
+    try:
+        lines = [(line["name"], int(line["qty"])) for line in body.get("lines", [])]
+    except (KeyError, TypeError, ValueError):
+        return jsonify(error="lines must be a list of {name, qty}"), 400
+    sales, errors = checkout(lines)
+    if errors:
+        return jsonify(errors=errors), 409
+    return jsonify(
+        sales=sales,
+        total=sum(s.revenue for s in sales),
+        profit=sum(s.profit for s in sales)
+    )
 
 @app.route("/profit")
 def profit():
     date = request.args.get("date", datetime.now().strftime("%Y-%m-%d"))
-    sales = load_sales()
-    profit = sum(s["profit"] for s in sales if s["date"] == date)
+    profit = branch().ledger.day(date, branch().items.pending_sales())["profit"]
     return f"Profit for {date}: MMK{int(profit)}"
 
+def parse_date_arg(key):
+    value = request.args.get(key)
+    if not value:
+        return None
+    datetime.strptime(value, "%Y-%m-%d")
+    return value
+
+@app.route("/api/reports/sales")
+def sales_report():
+    group = request.args.get("group", "day")
+    if group not in GROUPS:
+        return jsonify(error=f"group must be one of {', '.join(GROUPS)}"), 400
+    try:
+        start = parse_date_arg("from")
+        end = parse_date_arg("to")
+    except ValueError:
+        return jsonify(error="from/to must be YYYY-MM-DD"), 400
+    report = branch().ledger.report(start, end, group)
+    return jsonify({"from": start, "to": end, "group": group, **report})
+
+def merge_reports(reports, group):
+    """Sum ledger reports from several branches into one, row by row on their key."""
+    rows = {}
+    totals = {"profit": 0.0, "qty": 0, "revenue": 0.0}
+    for report in reports:
+        for field in totals:
+            totals[field] += report["totals"][field]
+        for row in report["rows"]:
+            merged = rows.setdefault(row["key"], {"key": row["key"], "profit": 0.0, "qty": 0, "revenue": 0.0})
+            merged["profit"] += row["profit"]
+            merged["qty"] += row["qty"]
+            merged["revenue"] += row["revenue"]
+    # Items stay in first-sold order like a single ledger's; periods are put back in date order
+    merged_rows = list(rows.values()) if group == "item" else sorted(rows.values(), key=lambda r: r["key"])
+    return {"totals": totals, "rows": merged_rows}
+
+@app.route("/api/reports/sales/consolidated")
+def consolidated_sales_report():
+    """The sales report summed over every branch, each branch's ledger read on its own thread."""
+    group = request.args.get("group", "day")
+    if group not in GROUPS:
+        return jsonify(error=f"group must be one of {', '.join(GROUPS)}"), 400
+    try:
+        start = parse_date_arg("from")
+        end = parse_date_arg("to")
+    except ValueError:
+        return jsonify(error="from/to must be YYYY-MM-DD"), 400
+    results = branches.map(lambda b: b.ledger.report(start, end, group))
+    report = merge_reports([r for _, r in results], group)
+    return jsonify({
+        "from": start, "to": end, "group": group, **report,
+        "branches": {b.id: r["totals"] for b, r in results}
+    })
+
+@app.route("/api/forecast")
+def forecast_api():
+    """Velocity and days of stock left per item, from the last background forecast run."""
+    forecast = branch().forecast
+    data = forecast.cached() or forecast.refresh()
+    if data is None:
+        # Another process holds the lock for the first run; its result is on the way
+        response = jsonify(error="The forecast is still being computed")
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    order = request.args.get("order") in ("1", "true", "yes")
+    rows = forecast.purchase_order(data) if order else data["items"]
+    return jsonify(through=data["through"], computed_at=data["computed_at"], items=rows)
+
+@app.route("/api/analytics/sales")
+def sales_analytics_api():
+    """Per-date or per-item totals over the full history, computed on NumPy columns."""
+    analytics = branch().analytics
+    if analytics is None:
+        return jsonify(error="Sales analytics need numpy installed"), 503
+    by = request.args.get("by", "item")
+    if by not in ("date", "item"):
+        return jsonify(error="by must be date or item"), 400
+    sort = request.args.get("sort", "qty")
+    if sort not in ANALYTICS_SORTS:
+        return jsonify(error=f"sort must be one of {', '.join(ANALYTICS_SORTS)}"), 400
+    try:
+        start = parse_date_arg("from")
+        end = parse_date_arg("to")
+    except ValueError:
+        return jsonify(error="from/to must be YYYY-MM-DD"), 400
+    if by == "date":
+        rows = analytics.by_date(start, end)
+    else:
+        limit = request.args.get("limit", type=int)
+        rows = analytics.by_item(start, end, sort, max(limit, 1) if limit else None)
+    return jsonify({"from": start, "to": end, "by": by, "rows": rows})
+
+ITEM_SORTS = ("name", "stock", "sale_price")
+
+@app.route("/api/items")
+def items_api():
+    sort = request.args.get("sort", "name")
+    if sort.lstrip("-") not in ITEM_SORTS:
+        return jsonify(error=f"sort must be one of {', '.join(ITEM_SORTS)}, optionally prefixed with -"), 400
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    total, items = branch().items.search(request.args.get("q", ""), offset, limit, sort)
+    return jsonify(total=total, offset=offset, limit=limit, items=items)
+
+@app.route("/api/items/import", methods=["POST"])
+def import_items():
+    """Create or restock items from an uploaded CSV, all rows in one commit or none."""
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify(errors=["No file uploaded"]), 400
+    items, errors = read_items_csv(upload.stream)
+    if errors:
+        return jsonify(errors=errors), 400
+    created, updated = branch().items.add_many(items)
+    return jsonify(rows=len(items), created=created, updated=updated)
+
+def csv_download(rows, filename):
+    response = Response(rows, mimetype="text/csv")
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+@app.route("/export/items.csv")
+def export_items():
+    return csv_download(item_rows(load_items()), "items.csv")
+
+@app.route("/export/sales.csv")
+def export_sales():
+    try:
+        start = parse_date_arg("from")
+        end = parse_date_arg("to")
+    except ValueError:
+        return jsonify(error="from/to must be YYYY-MM-DD"), 400
+    current = branch()
+    return csv_download(sale_rows(current.archive.sales(current.sales_file, start, end)), "sales.csv")
+
+@app.route("/api/stock/<name>")
+def stock_lookup(name):
+    """Stock of one item in every branch, for sending customers (or stock) where it is."""
+    found = [(b, item) for b, item in branches.map(lambda b: b.items.get(name)) if item]
+    return jsonify(name=name, total=sum(item.stock for _, item in found), branches=[
+        {
+            "branch": b.id, "name": item.name, "stock": item.stock, "sale_price": item.sale_price,
+            "expiry": item.expiry, "reorder_level": item.reorder_level
+        }
+        for b, item in found
+    ])
+
+@app.route("/api/branches", methods=["GET", "POST"])
+def branches_api():
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        id = str(body.get("id", "")).strip().lower()
+        if branches.get(id):
+            return jsonify(error=f"Branch {id} already exists"), 409
+        created = branches.create(id)
+        if created is None:
+            return jsonify(error="id must be 1-32 lower-case letters, digits, - or _"), 400
+        return jsonify(id=created.id), 201
+    return jsonify(branches=branches.ids())
+
+def parse_time_arg(key, end_of_day=False):
+    """An ISO date or date-time argument as a journal timestamp; a bare date means its start or end."""
+    value = request.args.get(key)
+    if not value:
+        return None
+    when = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        when = when.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return when.isoformat(timespec="microseconds")
+
+@app.route("/api/items/stock")
+def stock_at_api():
+    """Stock of every item as it stood at ?at=, rebuilt from the movement journal."""
+    try:
+        at = parse_time_arg("at", end_of_day=True) or datetime.now().isoformat(timespec="microseconds")
+    except ValueError:
+        return jsonify(error="at must be an ISO date or date-time"), 400
+    stock = branch().items.stock_at(at)
+    if stock is None:
+        return jsonify(error=f"No stock history as far back as {at}"), 404
+    return jsonify(at=at, items=[{"name": name, "stock": stock[name]} for name in sorted(stock, key=str.casefold)])
+
+@app.route("/api/items/movements")
+def movements_api():
+    """The stock movement journal: sales, receipts, adjustments and deletes."""
+    try:
+        start = parse_time_arg("from")
+        end = parse_time_arg("to", end_of_day=True)
+    except ValueError:
+        return jsonify(error="from/to must be ISO dates or date-times"), 400
+    name = request.args.get("name") or None
+    return jsonify({"from": start, "to": end, "name": name, "movements": branch().items.movements(name, start, end)})
+
+@app.route("/api/items/expiring")
+def expiring_api():
+    days = request.args.get("days", EXPIRY_WARNING_DAYS, type=int)
+    if not 0 <= days <= MAX_EXPIRY_DAYS:
+        return jsonify(error=f"days must be between 0 and {MAX_EXPIRY_DAYS}"), 400
+    return jsonify(days=days, batches=branch().items.expiring(days))
+
+def alert_item(item):
+    return {"name": item.name, "stock": item.stock, "reorder_level": item.reorder_level}
+
+@app.route("/api/alerts/low-stock")
+def low_stock_api():
+    items, _ = branch().items.low_stock()
+    return jsonify(items=[alert_item(i) for i in items])
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/api/alerts/low-stock/stream")
+def low_stock_stream():
+    """Server-Sent Events: a snapshot of the low-stock list, then only the changes to it.
+
+    Under gunicorn each open stream holds a worker thread; asgi.py serves
+    this path without one.
+    """
+    store = branch().items
+
+    def events():
+        seq = None
+        idle = 0
+        while True:
+            changes = store.alerts_since(seq, ALERT_POLL_SECONDS) if seq is not None else None
+            if changes is None:
+                items, seq = store.low_stock()
+                yield sse("snapshot", {"items": [alert_item(i) for i in items]})
+                continue
+            if changes:
+                seq = changes[-1]["seq"]
+                idle = 0
+                for change in changes:
+                    yield sse("change", {k: v for k, v in change.items() if k != "seq"})
+                continue
+            idle += ALERT_POLL_SECONDS
+            if idle >= ALERT_KEEPALIVE_SECONDS:
+                idle = 0
+                yield ": keepalive\n\n"
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop nginx-style proxies from holding events back
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/api/medicines/suggest")
+def medicines_suggest():
+    query = request.args.get("q", "")
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 50)
+    return jsonify(query=query, suggestions=medicine_catalog.suggest(query, limit))
+
+# JSON API for tills and scanners: writes answer with the changed records instead of a redirect,
+# and each item carries a version for If-Match / If-None-Match
+ITEM_FIELDS = {"name": str, "stock": int, "original_price": float, "sale_price": float, "expiry": str, "reorder_level": int}
+OPERATION_STATUS = {"missing": 404, "conflict": 412, "exists": 409, "invalid": 400}
+
+def item_fields(data, required=()):
+    """Item fields from a JSON object, converted and checked. Raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("expected an object")
+    fields = {field: kind(data[field]) for field, kind in ITEM_FIELDS.items() if data.get(field) is not None}
+    missing = [field for field in required if field not in fields]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if "name" in fields and (not fields["name"].strip() or "," in fields["name"]):
+        raise ValueError("name can't be empty or contain commas")
+    if fields.get("stock", 0) < 0:
+        raise ValueError("stock can't be negative")
+    if "expiry" in fields:
+        fields["expiry"] = checked_expiry(fields["expiry"])
+    return fields
+
+def operation(data):
+    """A store operation from one JSON batch entry. Raises ValueError."""
+    op = data.get("op") if isinstance(data, dict) else None
+    if op not in ("add", "update", "delete"):
+        raise ValueError("op must be add, update or delete")
+    if not isinstance(data.get("name"), str) or not data["name"]:
+        raise ValueError("name is required")
+    version = data.get("version")
+    if version is not None and not isinstance(version, int):
+        raise ValueError("version must be an integer")
+    if op == "add":
+        fields = item_fields(data, ("original_price", "sale_price"))
+        fields.pop("name", None)
+        fields.setdefault("stock", 0)
+        fields["lot"] = clean_lot(data.get("lot"))
+    elif op == "update":
+        fields = item_fields(data)
+    else:
+        fields = {}
+    return {"op": op, "name": data["name"], "fields": fields, "version": version}
+
+def if_match_version():
+    """The item version named by an If-Match header, if any."""
+    tags = request.if_match.as_set()
+    if not tags:
+        return None
+    try:
+        return int(next(iter(tags)))
+    except ValueError:
+        abort(412)
+
+def item_response(item, status=200):
+    response = jsonify(item)
+    response.status_code = status
+    response.set_etag(str(item.version))
+    return response
+
+def operation_failed(errors, single):
+    # A lone operation gets its own status; a batch lists what stopped it
+    if single:
+        return jsonify(error=errors[0]["error"]), OPERATION_STATUS[errors[0]["reason"]]
+    return jsonify(errors=errors), 409
+
+@app.route("/api/v1/items", methods=["GET", "POST"])
+def v1_items():
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        entries = body.get("items") if isinstance(body, dict) and "items" in body else [body]
+        try:
+            operations = [operation({**entry, "op": "add"}) for entry in entries]
+        except (TypeError, ValueError) as e:
+            return jsonify(error=str(e)), 400
+        results, errors = branch().items.apply(operations)
+        if errors:
+            return operation_failed(errors, len(operations) == 1)
+        return jsonify(items=results)
+
+    sort = request.args.get("sort", "name")
+    if sort.lstrip("-") not in ITEM_SORTS:
+        return jsonify(error=f"sort must be one of {', '.join(ITEM_SORTS)}, optionally prefixed with -"), 400
+    etag = hashlib.sha1(repr((branch().id, branch().items.version(), request.query_string)).encode()).hexdigest()
+    cached = not_modified(etag, None)
+    if cached:
+        return cached
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    total, items = branch().items.search(request.args.get("q", ""), offset, limit, sort)
+    return with_validators(jsonify(total=total, offset=offset, limit=limit, items=items), etag, None)
+
+@app.route("/api/v1/items/batch", methods=["POST"])
+def v1_items_batch():
+    """Adds, updates and deletes applied together or not at all."""
+    body = request.get_json(silent=True)
+    entries = body.get("operations") if isinstance(body, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return jsonify(error="operations must be a non-empty list"), 400
+    operations = []
+    for i, entry in enumerate(entries):
+        try:
+            operations.append(operation(entry))
+        except (TypeError, ValueError) as e:
+            return jsonify(error=f"operation {i}: {e}"), 400
+    results, errors = branch().items.apply(operations)
+    if errors:
+        return operation_failed(errors, False)
+    return jsonify(results=results)
+
+@app.route("/api/v1/items/<name>", methods=["GET", "PATCH", "DELETE"])
+def v1_item(name):
+    if request.method == "GET":
+        item = branch().items.get(name)
+        if item is None:
+            return jsonify(error=f"Unknown item: {name}"), 404
+        item = item.copy()
+        if request.if_none_match.contains(str(item.version)):
+            response = app.response_class(status=304)
+            response.set_etag(str(item.version))
+            return response
+        return item_response(item)
+
+    body = request.get_json(silent=True) or {}
+    version = if_match_version()
+    if version is None and isinstance(body, dict):
+        version = body.get("version")
+    try:
+        op = operation({**body, "op": "update" if request.method == "PATCH" else "delete", "name": name,
+                        "version": version})
+    except (TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+    results, errors = branch().items.apply([op])
+    if errors:
+        return operation_failed(errors, True)
+    if results[0] is None:
+        return "", 204
+    return item_response(results[0])
+
+@app.route("/api/v1/sales", methods=["GET", "POST"])
+def v1_sales():
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        try:
+            lines = [(line["name"], int(line["qty"])) for line in body.get("lines", [])]
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return jsonify(error="lines must be a list of {name, qty}"), 400
+        sales, errors = checkout(lines)
+        if errors:
+            return jsonify(errors=errors), 409
+        # The items as they now stand, so the till can show stock and keep versions current
+        items = [item.copy() for item in map(branch().items.get, {s.name: None for s in sales}) if item]
+        return jsonify(
+            sales=sales,
+            items=items,
+            total=sum(s.revenue for s in sales),
+            profit=sum(s.profit for s in sales)
+        ), 201
+
+    try:
+        start = parse_date_arg("from")
+        end = parse_date_arg("to")
+    except ValueError:
+        return jsonify(error="from/to must be YYYY-MM-DD"), 400
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 1000)
+    current = branch()
+    sales = list(islice(current.archive.sales(current.sales_file, start, end), offset, offset + limit))
+    return jsonify({"from": start, "to": end, "offset": offset, "limit": limit, "sales": sales})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    current = branch()
+    return jsonify(branch=current.id, medicines=medicine_catalog.stats(), **current.stats())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=81)
@@ -0,0 +1,256 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from ledger import parse_sale
+from records import SalesTable
+from store import fsync_dir, stat_stamp
+
+MANIFEST_VERSION = 1
+PARTITION_VERSION = 1
+# Level 9 took twice as long for files about 1% smaller
+COMPRESS_LEVEL = 6
+# On-disk column types are fixed width, whatever the platform's long is
+COLUMNS = (("dates", "q"), ("name_ids", "q"), ("qty", "q"), ("profit", "d"), ("revenue", "d"))
+
+def rollup(table):
+    """Per-day totals in the ledger's shape: profit, qty, revenue and [qty, profit, revenue] per item."""
+    days = {}
+    for sale in table:
+        day = days.get(sale.date)
+        if day is None:
+            day = days[sale.date] = {"profit": 0.0, "qty": 0, "revenue": 0.0, "items": {}}
+        day["profit"] += sale.profit
+        day["qty"] += sale.qty
+        day["revenue"] += sale.revenue
+        totals = day["items"].setdefault(sale.name, [0, 0.0, 0.0])
+        totals[0] += sale.qty
+        totals[1] += sale.profit
+        totals[2] += sale.revenue
+    return days
+
+def write_partition(path, month, table):
+    """One month as gzip: a JSON header line (names and day rollups), then the raw columns."""
+    header = {"version": PARTITION_VERSION, "month": month, "rows": len(table), "names": table.names, "days": rollup(table)}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=COMPRESS_LEVEL) as f:
+            f.write((json.dumps(header) + "\n").encode("utf-8"))
+            for name, code in COLUMNS:
+                f.write(array(code, getattr(table, name)).tobytes())
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    return header
+
+def read_header(path):
+    with gzip.open(path, "rb") as f:
+        return json.loads(f.readline())
+
+def read_partition(path):
+    with gzip.open(path, "rb") as f:
+        header = json.loads(f.readline())
+        columns = []
+        for _, code in COLUMNS:
+            column = array(code)
+            column.frombytes(f.read(header["rows"] * column.itemsize))
+            columns.append(column)
+    return SalesTable.from_columns(header["names"], *columns)
+
+class SalesArchive:
+    """Closed months of sales moved out of the hot sales file by compact().
+
+    Each month is one compressed columnar partition; manifest.json lists
+    them with their date range and totals, plus compacted_through, the last
+    archived date. Lines in the hot file on or before that date were left
+    behind by an interrupted compaction and are already in a partition, so
+    readers skip them.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self._manifest = self._empty()
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _empty(self):
+        return {"version": MANIFEST_VERSION, "compacted_through": "", "partitions": []}
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return self._empty()
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"{self.manifest_path}: unsupported manifest version {manifest.get('version')}")
+        return manifest
+
+    def manifest(self):
+        with self._lock:
+            stamp = stat_stamp(self.manifest_path)
+            if stamp != self._stamp:
+                self._manifest = self._read_manifest()
+                self._stamp = stamp
+            return self._manifest
+
+    def compacted_through(self):
+        return self.manifest()["compacted_through"]
+
+    def partitions(self, start=None, end=None):
+        """Manifest entries whose dates overlap [start, end]."""
+        return [
+            entry for entry in self.manifest()["partitions"]
+            if not (start and entry["last"] < start) and not (end and entry["first"] > end)
+        ]
+
+    def days(self):
+        """Per-day rollups of every archived date, read from the partition headers only."""
+        days = {}
+        for entry in self.partitions():
+            days.update(read_header(os.path.join(self.directory, entry["file"]))["days"])
+        return days
+
+    def tables(self, start=None, end=None):
+        for entry in self.partitions(start, end):
+            yield read_partition(os.path.join(self.directory, entry["file"]))
+
+    def sales(self, hot_path, start=None, end=None):
+        """Every sale dated in [start, end]: the overlapping partitions, then the hot file."""
+        for table in self.tables(start, end):
+            for sale in table:
+                if (not start or sale.date >= start) and (not end or sale.date <= end):
+                    yield sale
+        through = self.compacted_through()
+        try:
+            with open(hot_path, "r") as f:
+                for line in f:
+                    sale = parse_sale(line) if line.strip() else None
+                    if not sale or sale.date <= through:
+                        continue
+                    if (not start or sale.date >= start) and (not end or sale.date <= end):
+                        yield sale
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _writer_lock(self, hot_path):
+        # The same lock SalesWriter holds while appending
+        with open(hot_path + ".lock", "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _write_manifest(self, manifest):
+        tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+        fsync_dir(self.manifest_path)
+
+    def compact(self, hot_path, before=None):
+        """Move sales dated before the first day of month `before` (default: this month) into partitions.
+
+        Partitions and the manifest are written first; the hot file is then
+        replaced by one holding only the remaining lines. A crash in between
+        leaves duplicates in the hot file that readers skip. The current month
+        is still being written to, so `before` may not be later than it.
+        """
+        this_month = date.today().replace(day=1).isoformat()
+        cutoff = date.fromisoformat(f"{before}-01").isoformat() if before else this_month
+        if cutoff > this_month:
+            raise ValueError(f"{cutoff[:7]} is later than the current month, {this_month[:7]}")
+        with self._writer_lock(hot_path):
+            manifest = self._read_manifest()
+            through = manifest["compacted_through"]
+            moved = {}
+            keep = []
+            try:
+                with open(hot_path, "r") as f:
+                    for line in f:
+                        # A torn last line from a crashed writer is dropped, as SalesWriter would
+                        if not line.strip() or not line.endswith("\n"):
+                            continue
+                        sale = parse_sale(line)
+                        if sale is None or sale.date >= cutoff:
+                            # Unreadable lines stay where they are rather than being lost
+                            keep.append(line)
+                        elif sale.date > through:
+                            moved.setdefault(sale.date[:7], []).append(sale)
+            except FileNotFoundError:
+                pass
+
+            os.makedirs(self.directory, exist_ok=True)
+            entries = {entry["month"]: entry for entry in manifest["partitions"]}
+            for month, sales in sorted(moved.items()):
+                path = os.path.join(self.directory, f"{month}.sales.gz")
+                table = read_partition(path) if month in entries else SalesTable()
+                for sale in sales:
+                    table.append(sale)
+                days = write_partition(path, month, table)["days"]
+                entries[month] = {
+                    "month": month,
+                    "file": os.path.basename(path),
+                    "rows": len(table),
+                    "first": min(days),
+                    "last": max(days),
+                    "qty": sum(d["qty"] for d in days.values()),
+                    "profit": sum(d["profit"] for d in days.values()),
+                    "revenue": sum(d["revenue"] for d in days.values())
+                }
+            last_day = (date.fromisoformat(cutoff) - timedelta(days=1)).isoformat()
+            manifest["compacted_through"] = max(through, last_day)
+            manifest["partitions"] = [entries[month] for month in sorted(entries)]
+            self._write_manifest(manifest)
+
+            tmp = f"{hot_path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write("".join(keep))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, hot_path)
+            fsync_dir(hot_path)
+        return {
+            "archived": sum(len(sales) for sales in moved.values()),
+            "months": sorted(moved),
+            "kept": len(keep),
+            "compacted_through": manifest["compacted_through"]
+        }
+
+    def stats(self):
+        manifest = self.manifest()
+        return {
+            "partitions": len(manifest["partitions"]),
+            "rows": sum(entry["rows"] for entry in manifest["partitions"]),
+            "compacted_through": manifest["compacted_through"]
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Move closed months of sales.txt into compressed monthly partitions.")
+    parser.add_argument("--sales", default="sales.txt")
+    parser.add_argument("--archive", default="sales.archive")
+    parser.add_argument("--before", help="archive months before this YYYY-MM (default: the current month)")
+    args = parser.parse_args()
+    try:
+        result = SalesArchive(args.archive).compact(args.sales, args.before)
+    except ValueError as e:
+        parser.error(f"--before: {e}")
+    print(f"archived {result['archived']} sales from {len(result['months'])} months "
+          f"({', '.join(result['months']) or 'none'}); {result['kept']} left in {args.sales}; "
+          f"compacted through {result['compacted_through']}")
+
+if __name__ == "__main__":
+    main()
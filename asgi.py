@@ -0,0 +1,246 @@
+"""ASGI entry point, for serving many long-lived connections from a few processes.
+
+    uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 81
+
+Ordinary requests go to the Flask app on a bounded thread pool, so file
+reads and fsyncs never block the event loop. The low-stock alert stream is
+served here instead: each branch has one poller on the pool watching for
+changes, and every open stream is only a queue on the event loop, so
+thousands of idle dashboards cost no threads.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import ALERT_KEEPALIVE_SECONDS, ALERT_POLL_SECONDS, MAIN, alert_item, app as flask_app, branches, sse, warm_up
+from branches import split_branch
+
+# Threads running Flask requests and store calls; one per branch is taken while its alerts are watched
+ASGI_THREADS = int(os.environ.get("INVENTORY_ASGI_THREADS", "16"))
+# Bytes of a response body gathered on a pool thread before each send
+CHUNK_BYTES = 64 * 1024
+ALERT_STREAM = "/api/alerts/low-stock/stream"
+
+def wsgi_environ(scope, body):
+    root = scope.get("root_path", "")
+    path = scope["path"]
+    if root and path.startswith(root):
+        path = path[len(root):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        # PEP 3333 strings carry the raw bytes as latin-1
+        "SCRIPT_NAME": root.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        # Tells the dashboard it may hold the alert stream open
+        "inventory.alert_stream": True
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        if name == "content-type":
+            key = "CONTENT_TYPE"
+        elif name == "content-length":
+            key = "CONTENT_LENGTH"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def read_chunk(iterator):
+    """Up to about CHUNK_BYTES of a WSGI body, and whether there is more."""
+    chunks = []
+    size = 0
+    for chunk in iterator:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_BYTES:
+            return b"".join(chunks), True
+    return b"".join(chunks), False
+
+class AlertHub:
+    """Fans one branch's low-stock changes out to every stream open on it.
+
+    A single poller waits on the store for changes while anyone is
+    listening. Events are numbered as the store numbers them, so a stream
+    that started from a newer snapshot skips the ones it already has.
+    """
+
+    def __init__(self, store, run):
+        self.store = store
+        self.run = run
+        self.queues = set()
+        self._task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self.queues.add(queue)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._watch())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+
+    def _publish(self, seq, text):
+        for queue in self.queues:
+            queue.put_nowait((seq, text))
+
+    async def _watch(self):
+        seq = None
+        try:
+            while self.queues:
+                changes = await self.run(self.store.alerts_since, seq, ALERT_POLL_SECONDS) if seq is not None else None
+                if changes is None:
+                    items, seq = await self.run(self.store.low_stock)
+                    self._publish(seq, sse("snapshot", {"items": [alert_item(i) for i in items]}))
+                    continue
+                for change in changes:
+                    self._publish(change["seq"], sse("change", {k: v for k, v in change.items() if k != "seq"}))
+                if changes:
+                    seq = changes[-1]["seq"]
+        finally:
+            self._task = None
+
+class AsgiApp:
+    def __init__(self, wsgi_app, threads=ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="asgi")
+        self.hubs = {}
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            body = b""
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body += message.get("body", b"")
+                if not message.get("more_body"):
+                    break
+            environ = wsgi_environ(scope, body)
+            hub = self.alert_hub(environ)
+            if hub:
+                await self.stream_alerts(hub, receive, send)
+            else:
+                await self.call_wsgi(environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Each worker loads its own data; there is no preloading master to fork from
+                try:
+                    await self.run(warm_up)
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def alert_hub(self, environ):
+        """The hub for an alert stream request, or None for any other request."""
+        id, path = split_branch(environ["PATH_INFO"])
+        if environ["REQUEST_METHOD"] != "GET" or path != ALERT_STREAM:
+            return None
+        branch = branches.get(id or environ.get("HTTP_X_BRANCH") or MAIN)
+        if branch is None:
+            # Flask answers the 404
+            return None
+        hub = self.hubs.get(branch.id)
+        if hub is None:
+            hub = self.hubs[branch.id] = AlertHub(branch.items, self.run)
+        return hub
+
+    def _start_wsgi(self, environ):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = status
+            started["headers"] = headers
+
+        body = self.wsgi_app(environ, start_response)
+        iterator = iter(body)
+        # Some apps only call start_response once the body is iterated
+        first = read_chunk(iterator)
+        return started, body, iterator, first
+
+    async def call_wsgi(self, environ, send):
+        started, body, iterator, (chunk, more) = await self.run(self._start_wsgi, environ)
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": int(started["status"].split(" ", 1)[0]),
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in started["headers"]]
+            })
+            while True:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    break
+                chunk, more = await self.run(read_chunk, iterator)
+        finally:
+            if hasattr(body, "close"):
+                await self.run(body.close)
+
+    async def stream_alerts(self, hub, receive, send):
+        """The same events as the Flask stream: a snapshot, then changes, with keepalives while idle."""
+        queue = hub.subscribe()
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            items, seq = await self.run(hub.store.low_stock)
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no")
+                ]
+            })
+            snapshot = sse("snapshot", {"items": [alert_item(i) for i in items]})
+            await send({"type": "http.response.body", "body": snapshot.encode("utf-8"), "more_body": True})
+            while True:
+                event = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    {event, disconnected}, timeout=ALERT_KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected in done:
+                    event.cancel()
+                    return
+                if event in done:
+                    event_seq, text = event.result()
+                    if event_seq <= seq:
+                        continue
+                    seq = event_seq
+                else:
+                    event.cancel()
+                    text = ": keepalive\n\n"
+                await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+        finally:
+            hub.unsubscribe(queue)
+            disconnected.cancel()
+
+app = AsgiApp(flask_app)
@@ -0,0 +1,85 @@
+"""Time the NumPy sales analytics over a synthetic multi-year history.
+
+    python bench/analytics.py --sales 2000000 --years 4
+
+Reports the first (parsing) load, a start from the memory-mapped cache,
+and the per-date and per-item reports, next to the ledger's rollup report.
+Then appends --appends single sales, refreshing after each as a worker
+would after every sale, and checks the reports still match a full parse.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import SalesAnalytics
+from ledger import SalesLedger
+
+def write_sales(path, n, years, items):
+    start = date.today() - timedelta(days=365 * years)
+    span = 365 * years
+    rnd = random.Random(1)
+    names = [f"Medicine{i:05d}" for i in range(items)]
+    with open(path, "w") as f:
+        for i in range(n):
+            day = start + timedelta(days=i * span // n)
+            qty = rnd.randint(1, 5)
+            price = rnd.uniform(0.5, 20)
+            f.write(f"{day.isoformat()},{rnd.choice(names)},{qty},{qty * price * 0.2},{qty * price}\n")
+
+def timed(label, fn):
+    t = time.perf_counter()
+    result = fn()
+    print(f"{label:<36}{(time.perf_counter() - t) * 1000:>10.1f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, default=2_000_000)
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--appends", type=int, default=1000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "sales.txt")
+        cache = os.path.join(tmp, "sales.cols")
+        write_sales(path, args.sales, args.years, args.items)
+        print(f"{args.sales:,} sales over {args.years} years, {os.path.getsize(path) / 2**20:.0f} MiB")
+
+        timed("parse into columns + write cache", SalesAnalytics(path, cache_dir=cache).refresh)
+        analytics = SalesAnalytics(path, cache_dir=cache)
+        timed("start from mapped cache", analytics.refresh)
+        timed("by date, full history", analytics.by_date)
+        timed("by item, full history", lambda: analytics.by_item())
+        timed("top 10 by margin, last year", lambda: analytics.by_item(
+            (date.today() - timedelta(days=365)).isoformat(), None, "margin", 10))
+
+        def append_and_refresh():
+            today = date.today().isoformat()
+            for i in range(args.appends):
+                with open(path, "a") as f:
+                    f.write(f"{today},Medicine{i % args.items:05d},1,0.5,2.0\n")
+                analytics.refresh()
+        t = time.perf_counter()
+        append_and_refresh()
+        print(f"{'refresh after each new sale':<36}{(time.perf_counter() - t) * 1e6 / args.appends:>10.1f} us each"
+              f"  (still mapped: {analytics.stats()['mapped']})")
+        if analytics.by_item() != SalesAnalytics(path).by_item():
+            raise AssertionError("incremental columns differ from a full parse")
+
+        ledger = SalesLedger(path)
+        timed("ledger rollup build", ledger.refresh)
+        timed("ledger report by item", lambda: ledger.report(group="item"))
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare a till selling through the HTML form with one using the JSON API over a kept-alive connection.
+
+    python bench/api.py --sales 500 --items 1000
+
+The form flow is what a browser does: POST /sell, then follow the redirect
+and download the dashboard, on a new connection each time. The API flow
+sends POST /api/v1/sales on one persistent connection and gets back only
+the sale and the item's new stock and version.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sys
+import time
+import urllib.parse
+
+from datagen import generate, item_name
+from harness import copy_app, gunicorn, percentile
+
+def form_sale(port, name):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    body = urllib.parse.urlencode({"name": name, "qty": 1})
+    conn.request("POST", "/sell", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("GET", response.getheader("Location"))
+    size = len(conn.getresponse().read())
+    conn.close()
+    return size
+
+def api_sale(conn, name):
+    body = json.dumps({"lines": [{"name": name, "qty": 1}]})
+    conn.request("POST", "/api/v1/sales", body, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = response.read()
+    if response.status != 201:
+        raise RuntimeError(f"sale failed: {response.status} {data[:200]}")
+    return len(data)
+
+def run(label, sale, n):
+    times, sizes = [], []
+    for i in range(n):
+        t = time.perf_counter()
+        sizes.append(sale(item_name(i % 100)))
+        times.append(time.perf_counter() - t)
+    print(f"{label:<24} p50 {percentile(times, 50) * 1000:6.1f} ms  p95 {percentile(times, 95) * 1000:6.1f} ms  "
+          f"{sum(sizes) / n / 1024:7.1f} KiB per sale")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, default=500)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    workdir = copy_app(prefix="inventory-api-")
+    try:
+        generate(workdir, args.items, 10000)
+        # Enough stock that no sale is refused
+        with open(os.path.join(workdir, "items.txt"), "w") as f:
+            for i in range(args.items):
+                f.write(f"{item_name(i)},{args.sales * 2},1.0,2.0,\n")
+        with gunicorn(workdir, args.workers, args.port, threads=4):
+            run("form + redirect", lambda name: form_sale(args.port, name), args.sales)
+            conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=60)
+            run("JSON API, keep-alive", lambda name: api_sale(conn, name), args.sales)
+            conn.close()
+    finally:
+        shutil.rmtree(workdir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Time range reads of sales history before and after compaction into monthly partitions.
+
+    python bench/archive.py --sales 1000000 --years 3
+
+Reads one recent month, one older month and the whole history through
+SalesArchive.sales(), first with everything still in the hot file and then
+after compact() has moved the closed months out.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import SalesArchive
+from datagen import write_sales
+
+def timed(label, fn):
+    t = time.perf_counter()
+    result = fn()
+    print(f"{label:<40}{(time.perf_counter() - t) * 1000:>10.1f} ms")
+    return result
+
+def read_ranges(archive, path, label):
+    today = date.today()
+    last_month = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+    older = last_month.replace(year=last_month.year - 1)
+    for name, start, end in (
+        ("last month", last_month, today.replace(day=1) - timedelta(days=1)),
+        ("same month a year earlier", older, older.replace(day=28)),
+        ("whole history", None, None),
+    ):
+        timed(f"{label}: {name}", lambda: sum(1 for _ in archive.sales(
+            path, start and start.isoformat(), end and end.isoformat())))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--years", type=int, default=3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "sales.txt")
+        write_sales(path, args.sales, 2000, days=365 * args.years)
+        archive = SalesArchive(os.path.join(tmp, "sales.archive"))
+        hot = os.path.getsize(path)
+        read_ranges(archive, path, "hot file")
+        result = timed("compact", lambda: archive.compact(path))
+        parts = sum(os.path.getsize(os.path.join(archive.directory, e["file"])) for e in archive.partitions())
+        print(f"{result['archived']:,} sales in {len(result['months'])} partitions, "
+              f"{hot / 2**20:.0f} MiB text -> {parts / 2**20:.0f} MiB compressed; "
+              f"{os.path.getsize(path) / 2**20:.1f} MiB left hot")
+        read_ranges(archive, path, "partitioned")
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
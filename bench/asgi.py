@@ -0,0 +1,131 @@
+"""Hold many idle alert streams open against the sync and the ASGI deployments.
+
+    python bench/asgi.py --streams 2000 --workers 2
+
+For each deployment (gunicorn with gunicorn.conf.py and --threads, then uvicorn with
+asgi.py) this opens --streams low-stock alert streams, then reports:
+
+- how many got their first snapshot within --wait seconds
+- the latency of ordinary API requests made while the streams are open,
+  and how many went unanswered
+- how many streams saw a low-stock change, made through the API, within
+  --wait seconds
+"""
+import argparse
+import json
+import os
+import resource
+import selectors
+import shutil
+import socket
+import sys
+import time
+import urllib.request
+
+from harness import copy_app, gunicorn, percentile, uvicorn
+
+STREAM = b"GET /api/alerts/low-stock/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n"
+
+def open_streams(port, n, timeout):
+    """Up to n streams; stops at the first connection the server does not take within timeout."""
+    streams = []
+    for _ in range(n):
+        try:
+            sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+            sock.sendall(STREAM)
+        except OSError:
+            break
+        sock.setblocking(False)
+        streams.append(sock)
+    return streams
+
+def wait_for_marker(streams, received, marker, seconds):
+    """Read from every stream for up to seconds. Returns how many have marker in what they sent."""
+    selector = selectors.DefaultSelector()
+    for sock in streams:
+        if marker not in received[sock]:
+            selector.register(sock, selectors.EVENT_READ)
+    deadline = time.monotonic() + seconds
+    while selector.get_map() and time.monotonic() < deadline:
+        for key, _ in selector.select(timeout=max(0.0, deadline - time.monotonic())):
+            try:
+                data = key.fileobj.recv(65536)
+            except OSError:
+                data = b""
+            received[key.fileobj] += data
+            if not data or marker in received[key.fileobj]:
+                selector.unregister(key.fileobj)
+    selector.close()
+    return sum(marker in received[sock] for sock in streams)
+
+def api_latencies(base, n, timeout):
+    """Times of up to n requests, and how many went unanswered. The first timeout ends the run."""
+    times = []
+    for _ in range(n):
+        t = time.perf_counter()
+        try:
+            urllib.request.urlopen(base + "/api/items?limit=10", timeout=timeout).read()
+        except OSError:
+            break
+        times.append(time.perf_counter() - t)
+    return times, n - len(times)
+
+def make_low(base, timeout):
+    """Drop the watched item below its reorder level. Returns False if the server did not answer."""
+    request = urllib.request.Request(
+        base + "/api/v1/items/Watched", data=json.dumps({"stock": 1}).encode(), method="PATCH",
+        headers={"Content-Type": "application/json"}
+    )
+    try:
+        urllib.request.urlopen(request, timeout=timeout).read()
+    except OSError:
+        return False
+    return True
+
+def measure(label, server, args):
+    workdir = copy_app(prefix="inventory-asgi-")
+    with open(os.path.join(workdir, "items.txt"), "w") as f:
+        f.write("Watched,100,1.0,2.0,\n")
+        for i in range(1000):
+            f.write(f"Item{i:07d},100,1.0,2.0,\n")
+    open(os.path.join(workdir, "sales.txt"), "w").close()
+    try:
+        with server(workdir, args.workers, args.port) as base:
+            started = time.perf_counter()
+            streams = open_streams(args.port, args.streams, args.wait)
+            received = {sock: b"" for sock in streams}
+            snapshots = wait_for_marker(streams, received, b"event: snapshot", args.wait)
+            opened = time.perf_counter() - started
+            times, failures = api_latencies(base, args.requests, args.wait)
+            changed = make_low(base, args.wait)
+            changes = wait_for_marker(streams, received, b"event: change", args.wait) if changed else 0
+            for sock in streams:
+                sock.close()
+    finally:
+        shutil.rmtree(workdir)
+    api = (f"api p50 {percentile(times, 50) * 1000:7.1f} ms p95 {percentile(times, 95) * 1000:7.1f} ms"
+           if times else "api no responses")
+    change = f"changes {changes:>5}/{args.streams}" if changed else "change not accepted"
+    print(f"{label:<6} snapshots {snapshots:>5}/{args.streams} in {opened:5.1f}s   {api} ({failures} unanswered)   {change}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="threads per gunicorn worker, as in gunicorn.conf.py")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--wait", type=float, default=10.0, help="seconds to wait for events and API responses")
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    # Each stream is a file descriptor here and in the server, which inherits this limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, args.streams * 2 + 256) if hard != resource.RLIM_INFINITY else args.streams * 2 + 256
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, wanted), hard))
+
+    measure("sync", lambda *a: gunicorn(*a, threads=args.threads), args)
+    measure("asgi", uvicorn, args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Check that busy branches leave another branch's latency alone, and time the consolidated report.
+
+    python bench/branches.py --branches 4 --items 1000 --sales 100000
+
+Main is measured twice under the same /sell and index load: once as the only
+branch, then again with --branches more branches of the same size, each
+taking its own stream of sales at the same time. The consolidated sales
+report, which reads every branch's ledger on the thread pool, is then timed
+against the single-branch report.
+
+Branches share no files or locks, so with a core per worker main's latency
+should hardly move; on fewer cores the other branches' requests still cost
+CPU time, and the slowdown shows that rather than any waiting on them.
+"""
+import argparse
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datagen import generate, item_name
+from harness import copy_app, gunicorn, percentile, request
+
+def latencies(base, paths, n, threads):
+    def timed(i):
+        path, fields = paths[i % len(paths)]
+        t = time.perf_counter()
+        request(base, path, fields, timeout=600)
+        return time.perf_counter() - t
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(timed, range(n)))
+
+def summary(label, values):
+    print(f"{label:<34} p50 {percentile(values, 50) * 1000:7.1f} ms  p95 {percentile(values, 95) * 1000:7.1f} ms")
+
+def measure(workdir, ids, args):
+    main_load = [("/sell", {"name": item_name(i), "qty": 1}) for i in range(10)] + [("/", None)]
+    with gunicorn(workdir, args.workers, args.port, timeout=600) as base:
+        stop = threading.Event()
+
+        def other_branches():
+            i = 0
+            while not stop.is_set():
+                request(base, f"/b/{ids[i % len(ids)]}/sell", {"name": item_name(i % 10), "qty": 1}, timeout=600)
+                i += 1
+
+        background = [threading.Thread(target=other_branches) for _ in range(args.threads if ids else 0)]
+        for thread in background:
+            thread.start()
+        try:
+            values = latencies(base, main_load, args.requests, args.threads)
+        finally:
+            stop.set()
+            for thread in background:
+                thread.join()
+        reports = {
+            path: latencies(base, [(path, None)], 20, 1)
+            for path in ("/api/reports/sales?group=month", "/api/reports/sales/consolidated?group=month")
+        }
+    return values, reports
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--branches", type=int, default=4)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--sales", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    workdir = copy_app(prefix="inventory-branches-")
+    try:
+        generate(workdir, args.items, args.sales)
+        alone, _ = measure(workdir, [], args)
+
+        ids = [f"b{i}" for i in range(1, args.branches + 1)]
+        for id in ids:
+            os.makedirs(os.path.join(workdir, "branches", id))
+            generate(os.path.join(workdir, "branches", id), args.items, args.sales)
+        shared, shared_reports = measure(workdir, ids, args)
+
+        summary("main, only branch", alone)
+        summary(f"main, {args.branches} other busy branches", shared)
+        summary("report, one branch", shared_reports["/api/reports/sales?group=month"])
+        summary(f"consolidated, {args.branches + 1} branches",
+                shared_reports["/api/reports/sales/consolidated?group=month"])
+        slowdown = percentile(shared, 50) / percentile(alone, 50)
+        print(f"main p50 with other branches busy: x{slowdown:.2f}")
+    finally:
+        shutil.rmtree(workdir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Compare first-request latency of fresh gunicorn workers with and without the preload warm-up.
+
+    python bench/coldstart.py --sizes 1k:10k,100k:1M --workers 4
+
+For each ITEMS:SALES size and each mode, a fresh copy of the app starts
+under gunicorn and is sent one index request per worker, several times over,
+as soon as it accepts connections. "lazy" runs without a config file, so every
+worker loads the data on its first requests; "preload" uses gunicorn.conf.py,
+which warms everything up once in the master before forking. "preload,
+cached" starts again over the caches the first preload run wrote.
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datagen import generate
+from harness import copy_app, gunicorn, percentile, request
+from routes import count
+
+def first_requests(base, n, threads):
+    def timed(_):
+        t = time.perf_counter()
+        request(base, "/", timeout=600)
+        return time.perf_counter() - t
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(timed, range(n)))
+
+def run(workdir, config, workers, port):
+    started = time.perf_counter()
+    with gunicorn(workdir, workers, port, timeout=600, config=config) as base:
+        ready = time.perf_counter() - started
+        latencies = first_requests(base, workers * 3, workers)
+    return ready, latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1k:10k,100k:1M")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    print(f"{'size':<12}{'mode':<16}{'ready s':>10}{'p50 ms':>10}{'max ms':>10}")
+    for size in args.sizes.split(","):
+        items, sales = (count(n) for n in size.split(":"))
+        for mode in ("lazy", "preload"):
+            workdir = copy_app()
+            try:
+                generate(workdir, items, sales)
+                empty = os.path.join(workdir, "lazy.conf.py")
+                open(empty, "w").close()
+                runs = [(mode, empty if mode == "lazy" else None)]
+                if mode == "preload":
+                    runs.append(("preload, cached", None))
+                for label, config in runs:
+                    ready, latencies = run(workdir, config, args.workers, args.port)
+                    print(f"{size:<12}{label:<16}{ready:>10.1f}"
+                          f"{percentile(latencies, 50) * 1000:>10.1f}{max(latencies) * 1000:>10.1f}")
+                    sys.stdout.flush()
+            finally:
+                shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
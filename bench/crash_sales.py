@@ -0,0 +1,135 @@
+"""Kill the app mid-stream of /sell requests and check no sale or stock is lost.
+
+    python bench/crash_sales.py --threads 16 --seconds 2 --rounds 5
+
+A child process imports the app in a scratch directory and sells from many
+threads through /sell, logging each sale once its request returns. The
+sales writer waits --flush-interval for more sales before each write, so
+the kill usually lands while decrements are logged but their sales are not
+yet in the sales file. The parent SIGKILLs it, appends half a line as a
+crash mid-write would leave, then starts the app again the way a server
+does (warm_up) and checks that:
+
+- the torn line is cut off and every line parses
+- every acknowledged sale is in the sales file, and none is there twice
+- for every item, stock left plus units sold is still the starting stock
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from harness import copy_app
+
+ITEMS = 20
+STOCK = 10 ** 6
+
+def child(threads):
+    sys.path.insert(0, os.getcwd())
+    import app
+    acks = open("acks.txt", "a", buffering=1)
+    lock = threading.Lock()
+
+    def sell():
+        client = app.app.test_client()
+        rnd = random.Random()
+        while True:
+            name = f"Item{rnd.randrange(ITEMS)}"
+            if client.post("/sell", data={"name": name, "qty": "1"}).status_code != 302:
+                raise SystemExit("sale failed")
+            with lock:
+                acks.write(name + "\n")
+
+    for _ in range(threads):
+        threading.Thread(target=sell, daemon=True).start()
+    threading.Event().wait()
+
+def check():
+    sys.path.insert(0, os.getcwd())
+    import app
+    from ledger import parse_sale, sale_ref
+    app.warm_up()
+    with open("sales.txt") as f:
+        lines = f.read().splitlines()
+    sales = [parse_sale(line) for line in lines]
+    if None in sales:
+        raise AssertionError("unparseable line after recovery")
+    if app.branch().writer.recovered_bytes == 0:
+        raise AssertionError("torn tail was not cut off")
+    refs = [sale_ref(line) for line in lines]
+    if len(refs) != len(set(refs)):
+        raise AssertionError("a sale was written twice")
+    sold = Counter()
+    for sale in sales:
+        sold[sale.name] += sale.qty
+    with open("acks.txt") as f:
+        acked = Counter(f.read().split())
+    short = [name for name in acked if sold[name] < acked[name]]
+    if short:
+        raise AssertionError(f"acknowledged sales of {short[0]} lost: {acked[short[0]]} acked, {sold[short[0]]} on file")
+    for item in app.branch().items.load():
+        if item.stock + sold[item.name] != STOCK:
+            raise AssertionError(f"{item.name}: {item.stock} left + {sold[item.name]} sold != {STOCK}")
+    print(json.dumps({"acked": sum(acked.values()), "written": len(sales),
+                      "recovered": app.branch().writer.written}))
+
+def crash_round(workdir, args):
+    for name in ("items.txt.wal", "items.txt.journal", "sales.txt", "acks.txt"):
+        if os.path.exists(os.path.join(workdir, name)):
+            os.remove(os.path.join(workdir, name))
+    shutil.rmtree(os.path.join(workdir, "items.txt.journal.snapshots"), ignore_errors=True)
+    with open(os.path.join(workdir, "items.txt"), "w") as f:
+        for i in range(ITEMS):
+            f.write(f"Item{i},{STOCK},1.0,2.0,\n")
+    open(os.path.join(workdir, "sales.txt"), "w").close()
+
+    env = dict(os.environ, INVENTORY_SALES_FLUSH_INTERVAL=str(args.flush_interval))
+    script = os.path.abspath(__file__)
+    proc = subprocess.Popen([sys.executable, script, "--child", "--threads", str(args.threads)], cwd=workdir, env=env)
+    time.sleep(args.seconds)
+    proc.send_signal(signal.SIGKILL)
+    proc.wait()
+    with open(os.path.join(workdir, "sales.txt"), "a") as f:
+        f.write("2026-01-01,Torn,")
+    out = subprocess.run([sys.executable, script, "--check"], cwd=workdir, env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise AssertionError(out.stderr.strip().splitlines()[-1])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--check", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.threads)
+        return
+    if args.check:
+        check()
+        return
+
+    workdir = copy_app(prefix="inventory-crash-")
+    try:
+        for i in range(args.rounds):
+            result = crash_round(workdir, args)
+            # Sales logged but not yet acknowledged when the kill landed are kept too
+            print(f"round {i + 1}: {result['acked']} acknowledged, {result['written']} on disk "
+                  f"({result['recovered']} written from the items log on restart), none lost")
+    finally:
+        shutil.rmtree(workdir)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Write synthetic items.txt and sales.txt files of a given size.
+
+    python bench/datagen.py DIR --items 100000 --sales 1000000
+
+Item names are Item0000001, Item0000002, ...; sales are spread evenly over
+the last --days days and only name existing items.
+"""
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+CHUNK = 10000
+
+def item_name(i):
+    return f"Item{i:07d}"
+
+def write_items(path, n, seed=1):
+    rnd = random.Random(seed)
+    today = date.today()
+    with open(path, "w") as f:
+        for start in range(0, n, CHUNK):
+            lines = []
+            for i in range(start, min(n, start + CHUNK)):
+                buy = round(rnd.uniform(0.1, 20), 2)
+                expiry = (today + timedelta(days=rnd.randint(-30, 720))).isoformat() if rnd.random() < 0.8 else ""
+                lines.append(f"{item_name(i)},{rnd.randint(0, 500)},{buy},{round(buy * 1.3, 2)},{expiry}\n")
+            f.write("".join(lines))
+
+def write_sales(path, n, items, days=3 * 365, seed=2):
+    rnd = random.Random(seed)
+    first = date.today().toordinal() - days
+    with open(path, "w") as f:
+        for start in range(0, n, CHUNK):
+            lines = []
+            for i in range(start, min(n, start + CHUNK)):
+                day = date.fromordinal(first + i * days // max(n, 1)).isoformat()
+                qty = rnd.randint(1, 5)
+                price = rnd.uniform(0.1, 20)
+                lines.append(f"{day},{item_name(rnd.randrange(items))},{qty},{qty * price * 0.3},{qty * price * 1.3}\n")
+            f.write("".join(lines))
+
+def generate(workdir, items, sales):
+    write_items(os.path.join(workdir, "items.txt"), items)
+    write_sales(os.path.join(workdir, "sales.txt"), sales, max(items, 1))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--sales", type=int, default=10000)
+    args = parser.parse_args()
+    os.makedirs(args.dir, exist_ok=True)
+    generate(args.dir, args.items, args.sales)
+
+if __name__ == "__main__":
+    main()
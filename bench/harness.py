@@ -0,0 +1,91 @@
+"""Helpers shared by the bench scripts: a throwaway copy of the app and HTTP calls to it."""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def copy_app(prefix="inventory-bench-"):
+    """Copy the code, templates and static files into a new temp dir, without data files."""
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    for name in os.listdir(ROOT):
+        if name.endswith(".py"):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+    for name in ("templates", "static"):
+        shutil.copytree(os.path.join(ROOT, name), os.path.join(workdir, name))
+    return workdir
+
+def wait_for(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not come up")
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+_opener = urllib.request.build_opener(NoRedirect)
+
+def request(base, path, fields=None, timeout=60):
+    """GET, or POST form fields; the redirect after a form post counts as success."""
+    data = urllib.parse.urlencode(fields).encode() if fields is not None else None
+    try:
+        _opener.open(urllib.request.Request(base + path, data=data), timeout=timeout).read()
+    except urllib.error.HTTPError as e:
+        if e.code != 302:
+            raise
+
+@contextmanager
+def gunicorn(workdir, workers, port, timeout=60, threads=1, config=None):
+    """Run the app's gunicorn.conf.py (preloading and warm-up) unless another config is given."""
+    # Workers get the same allowance, so building caches over large files isn't cut short
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "-c", config or "gunicorn.conf.py", "-w", str(workers),
+            "--threads", str(threads), "-b", f"127.0.0.1:{port}", "-t", str(timeout), "app:app"
+        ],
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(base + "/api/cache/stats", timeout)
+        yield base
+    finally:
+        server.terminate()
+        server.wait()
+
+@contextmanager
+def uvicorn(workdir, workers, port, timeout=60):
+    """Run the app's ASGI entry point under uvicorn."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "asgi:app", "--workers", str(workers), "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(base + "/api/cache/stats", timeout)
+        yield base
+    finally:
+        server.terminate()
+        server.wait()
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
@@ -0,0 +1,81 @@
+"""Time point-in-time stock rebuilds from the movement journal, against replaying it from the top.
+
+    python bench/journal.py --items 1000 --moves 1000000
+
+Writes a synthetic journal of --moves sales and receipts over --items items
+through StockJournal.append, in checkpoint-sized chunks, so snapshots are
+taken as they would be in the app. Then rebuilds stock at timestamps spread
+through it: with stock_at(), from the nearest snapshot, and by replaying
+every line before the timestamp.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagen import item_name
+from journal import StockJournal, replay
+
+def write_journal(journal, items, moves, chunk, seed=3):
+    rnd = random.Random(seed)
+    stock = {item_name(i): 0 for i in range(items)}
+    journal.append([], dict(stock))
+    stamps = []
+    for start in range(0, moves, chunk):
+        batch = []
+        for _ in range(min(chunk, moves - start)):
+            name = item_name(rnd.randrange(items))
+            qty = rnd.randint(1, 50) if stock[name] < 10 else -rnd.randint(1, min(5, stock[name]))
+            stock[name] += qty
+            batch.append(journal.movement("receipt" if qty > 0 else "sale", name, qty, stock[name]))
+        journal.append(batch, dict(stock))
+        stamps.append(batch[-1]["ts"])
+    return stamps
+
+def full_replay(journal, ts):
+    state = {}
+    with open(journal.path, "rb") as f:
+        for line in f:
+            move = json.loads(line)
+            if move["ts"] > ts:
+                break
+            replay(state, [move])
+    return state
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--moves", type=int, default=1000000)
+    parser.add_argument("--chunk", type=int, default=2000, help="movements per append, as one items-log checkpoint")
+    parser.add_argument("--points", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="inventory-journal-")
+    try:
+        journal = StockJournal(os.path.join(workdir, "items.txt.journal"))
+        started = time.perf_counter()
+        stamps = write_journal(journal, args.items, args.moves, args.chunk)
+        print(f"wrote {args.moves} movements ({os.path.getsize(journal.path) / 1e6:.1f} MB, "
+              f"{len(journal.snapshots())} snapshots) in {time.perf_counter() - started:.1f}s")
+        for i in range(1, args.points + 1):
+            ts = stamps[len(stamps) * i // args.points - 1]
+            t = time.perf_counter()
+            fast = journal.stock_at(ts)
+            fast_ms = (time.perf_counter() - t) * 1000
+            t = time.perf_counter()
+            slow = full_replay(journal, ts)
+            slow_ms = (time.perf_counter() - t) * 1000
+            same = "same" if {k: v for k, v in fast.items() if v or k in slow} == slow else "DIFFERENT"
+            print(f"{ts}  stock_at {fast_ms:8.1f} ms   full replay {slow_ms:8.1f} ms   {same}")
+    finally:
+        shutil.rmtree(workdir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Compare the memory held by dict-per-row records and the compact representation.
+
+    python bench/memory.py --sales 1000000 --items 100000
+
+Sales are measured as a list of dicts (what load_sales used to build)
+against a SalesTable, and items as dicts against Item/Batch objects.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import parse_sale
+from records import SalesTable
+from store import parse_item
+
+def sale_lines(n, names):
+    start = date(2020, 1, 1)
+    rnd = random.Random(1)
+    for i in range(n):
+        day = start + timedelta(days=i * 1500 // n)
+        qty = rnd.randint(1, 5)
+        yield f"{day.isoformat()},{rnd.choice(names)},{qty},{qty * 0.25},{qty * 1.5}\n"
+
+def item_lines(n):
+    for i in range(n):
+        yield f"Medicine{i:06d},{i % 300},0.5,1.2,2027-01-01\n"
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return size
+
+def as_dict(sale):
+    return {"date": sale.date, "name": sale.name, "qty": sale.qty, "profit": sale.profit}
+
+def item_dict(item):
+    return {
+        "name": item.name, "stock": item.stock, "original_price": item.original_price,
+        "sale_price": item.sale_price, "expiry": item.expiry
+    }
+
+def build_table(lines):
+    table = SalesTable()
+    for line in lines:
+        table.append(parse_sale(line))
+    return table
+
+def report(label, before, after, rows):
+    print(f"{label:<28}{before / 2**20:>10.1f} MiB{after / 2**20:>10.1f} MiB"
+          f"{before / rows:>10.0f} B/row{after / rows:>8.0f} B/row{before / after:>8.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--items", type=int, default=100_000)
+    args = parser.parse_args()
+
+    names = [f"Medicine{i:06d}" for i in range(min(args.items, 5000))]
+    print(f"{'':<28}{'dicts':>14}{'compact':>14}")
+    old = measure(lambda: [as_dict(parse_sale(line)) for line in sale_lines(args.sales, names)])
+    new = measure(lambda: build_table(sale_lines(args.sales, names)))
+    report(f"{args.sales:,} sales", old, new, args.sales)
+    old = measure(lambda: [item_dict(parse_item(line)) for line in item_lines(args.items)])
+    new = measure(lambda: [parse_item(line) for line in item_lines(args.items)])
+    report(f"{args.items:,} items", old, new, args.items)
+
+if __name__ == "__main__":
+    main()
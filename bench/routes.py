@@ -0,0 +1,190 @@
+"""Time index, /sell, /add and /profit as the item and sales files grow.
+
+    python bench/routes.py --sizes 1k:10k,100k:1M
+    python bench/routes.py --sizes 1M:10M --modes gunicorn --workers 4
+    python bench/routes.py --save-baseline      # record bench/baseline.json
+    python bench/routes.py --check              # exit 1 on a regression
+
+Each size is ITEMS:SALES. For every size a fresh copy of the app gets
+synthetic data (bench/datagen.py), then each route is timed through the
+Flask test client and through a multi-worker gunicorn hit by concurrent
+threads. p50/p99 latency and throughput are printed and compared against
+the stored baseline.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datagen import generate, item_name
+from harness import copy_app, gunicorn, percentile, request
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+ROUTES = ("index", "sell", "add", "profit")
+
+def count(text):
+    units = {"k": 1000, "m": 1000000}
+    text = text.strip().lower()
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def route_calls(items):
+    """(name, path, fields factory) for each benchmarked route."""
+    rnd = random.Random()
+    added = iter(range(10 ** 9))
+    pid = os.getpid()
+    return [
+        ("index", "/", None),
+        ("sell", "/sell", lambda: {"name": item_name(rnd.randrange(items)), "qty": 1}),
+        ("add", "/add", lambda: {"name": f"Bench{pid}-{next(added)}", "stock": 5, "buy": 1, "sell": 2, "expiry": ""}),
+        ("profit", "/profit", None),
+    ]
+
+def summarise(latencies, elapsed):
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+
+def run_client(workdir, items, requests):
+    """Runs inside a child process with workdir as the current directory."""
+    sys.path.insert(0, workdir)
+    import app
+    client = app.app.test_client()
+    results = {}
+    for name, path, fields in route_calls(items):
+        # The first request pays for loading the files into this process
+        started = time.perf_counter()
+        client.open(path, method="POST" if fields else "GET", data=fields() if fields else None)
+        cold = time.perf_counter() - started
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            t = time.perf_counter()
+            response = client.open(path, method="POST" if fields else "GET", data=fields() if fields else None)
+            latencies.append(time.perf_counter() - t)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+        results[name] = {**summarise(latencies, time.perf_counter() - started), "cold_ms": round(cold * 1000, 3)}
+    return results
+
+def bench_client(workdir, items, requests):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--client", workdir, "--items-count", str(items), "--requests", str(requests)],
+        cwd=workdir, check=True, capture_output=True, text=True
+    )
+    return json.loads(out.stdout)
+
+def bench_gunicorn(workdir, items, requests, workers, threads, port):
+    results = {}
+    with gunicorn(workdir, workers, port, timeout=600) as base:
+        for name, path, fields in route_calls(items):
+            call = lambda timeout=60: request(base, path, fields() if fields else None, timeout)
+            # Let every worker load its data before timing
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(lambda _: call(600), range(workers * 4)))
+
+            def timed(_):
+                t = time.perf_counter()
+                call()
+                return time.perf_counter() - t
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                latencies = list(pool.map(timed, range(requests)))
+            results[name] = summarise(latencies, time.perf_counter() - started)
+    return results
+
+def compare(results, baseline, threshold, min_ms):
+    regressions = []
+    for mode, sizes in results.items():
+        for size, routes in sizes.items():
+            for route, now in routes.items():
+                before = baseline.get(mode, {}).get(size, {}).get(route)
+                if not before:
+                    continue
+                for metric in ("p50_ms", "p99_ms"):
+                    # Sub-millisecond jitter isn't worth flagging, whatever the ratio
+                    if now[metric] > before[metric] * threshold and now[metric] - before[metric] > min_ms:
+                        regressions.append(f"{mode} {size} {route} {metric}: {before[metric]} -> {now[metric]}")
+    return regressions
+
+def print_results(results):
+    print(f"{'mode':<10}{'size':<12}{'route':<8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'cold ms':>10}")
+    for mode, sizes in results.items():
+        for size, routes in sizes.items():
+            for route, r in routes.items():
+                cold = f"{r['cold_ms']:>10.1f}" if "cold_ms" in r else ""
+                print(f"{mode:<10}{size:<12}{route:<8}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.0f}{cold}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1k:10k,100k:1M")
+    parser.add_argument("--modes", default="client,gunicorn")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--threshold", type=float, default=1.5, help="slowdown factor counted as a regression")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any route regressed")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--client", help=argparse.SUPPRESS)
+    parser.add_argument("--items-count", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        print(json.dumps(run_client(args.client, args.items_count, args.requests)))
+        return
+
+    modes = args.modes.split(",")
+    results = {mode: {} for mode in modes}
+    for size in args.sizes.split(","):
+        items, sales = (count(n) for n in size.split(":"))
+        for mode in modes:
+            # Every mode starts from the same freshly generated files
+            workdir = copy_app()
+            try:
+                generate(workdir, items, sales)
+                if mode == "client":
+                    results[mode][size] = bench_client(workdir, items, args.requests)
+                else:
+                    results[mode][size] = bench_gunicorn(workdir, items, args.requests, args.workers, args.threads, args.port)
+            finally:
+                shutil.rmtree(workdir)
+            print(f"done {mode} {size}", file=sys.stderr)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "cpus": os.cpu_count(), "requests": args.requests, **results}, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print("no baseline to compare against; run with --save-baseline")
+        return
+    regressions = compare(results, baseline, args.threshold, args.min_ms)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"no route slower than {args.threshold}x the baseline")
+    if regressions and args.check:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
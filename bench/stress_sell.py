@@ -0,0 +1,62 @@
+"""Fire concurrent /sell requests at a multi-worker gunicorn and check no stock is lost.
+
+    python bench/stress_sell.py --workers 4 --requests 5000 --threads 64
+
+Runs against a copy of the app in a temporary directory, then checks that
+final stock + quantity sold equals the starting stock.
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import copy_app, gunicorn, request
+
+def sell(base, name):
+    request(base, "/sell", {"name": name, "qty": 1})
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--worker-threads", type=int, default=1, help="gunicorn --threads per worker")
+    parser.add_argument("--stock", type=int, default=3000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = copy_app(prefix="inventory-stress-")
+    with open(os.path.join(workdir, "items.txt"), "w") as f:
+        f.write(f"Stress,{args.stock},1.0,2.0,\n")
+    open(os.path.join(workdir, "sales.txt"), "w").close()
+
+    with gunicorn(workdir, args.workers, args.port, threads=args.worker_threads) as base:
+        started = time.time()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda _: sell(base, "Stress"), range(args.requests)))
+        elapsed = time.time() - started
+
+    sys.path.insert(0, workdir)
+    os.chdir(workdir)
+    from store import ItemStore
+    from ledger import parse_sale, sale_ref
+    store = ItemStore("items.txt")
+    stock = store.get("Stress").stock
+    with open("sales.txt") as f:
+        lines = f.read().splitlines()
+    sold = sum(s.qty for s in map(parse_sale, lines) if s)
+    # Sales a worker logged but had not copied over when it stopped are still in the items log
+    last = max((sale_ref(line) or 0 for line in lines), default=0)
+    sold += sum(s.qty for ref, s in store.pending_sales() if ref > last)
+    print(f"{args.requests} sales in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"initial={args.stock} final={stock} sold={sold}")
+    shutil.rmtree(workdir)
+    if stock + sold != args.stock or stock < 0:
+        print("FAIL: stock and sales do not add up")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
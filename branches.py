@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from analytics import SalesAnalytics, available as analytics_available
+from archive import SalesArchive
+from forecast import ReorderForecast
+from journal import StockJournal
+from ledger import SalesLedger
+from store import ItemStore
+from writer import SalesWriter
+
+BRANCH_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,31}$")
+MAIN = "main"
+# Derived from the sales file and kept beside it in each branch directory
+SALES_CHECKPOINT = "sales.idx"
+SALES_COLUMNS = "sales.cols"
+# Closed months moved out of the sales file by `python archive.py`
+SALES_ARCHIVE = "sales.archive"
+FORECAST = "forecast.json"
+
+class Branch:
+    """The item and sales stores of one shop, all kept in one directory.
+
+    Each branch has its own files, locks, caches and sales writer thread, so
+    stock moves and sales in one branch never wait on another.
+    """
+
+    def __init__(self, id, directory, items_file="items.txt", sales_file="sales.txt",
+                 flush_interval=0.0, batch_size=256, forecast_interval=300):
+        self.id = id
+        self.directory = directory
+        self.items_file = os.path.join(directory, items_file)
+        self.sales_file = os.path.join(directory, sales_file)
+        self.items = ItemStore(
+            self.items_file, journal=StockJournal(self.items_file + ".journal"),
+            on_checkpoint=lambda sales: self.writer.catch_up(sales)
+        )
+        self.archive = SalesArchive(os.path.join(directory, SALES_ARCHIVE))
+        self.ledger = SalesLedger(self.sales_file, checkpoint_path=os.path.join(directory, SALES_CHECKPOINT), archive=self.archive)
+        self.writer = SalesWriter(
+            self.sales_file, self.items.pending_sales, flush_interval, batch_size, on_commit=self.ledger.refresh
+        )
+        # numpy is optional; without it the analytics endpoint reports itself unavailable
+        self.analytics = SalesAnalytics(
+            self.sales_file, cache_dir=os.path.join(directory, SALES_COLUMNS), archive=self.archive
+        ) if analytics_available() else None
+        self.forecast = ReorderForecast(os.path.join(directory, FORECAST), self.ledger, self.items, max_age=forecast_interval)
+
+    def warm_up(self):
+        self.items.version()
+        # Sales a crashed process logged with their stock but never wrote out
+        self.writer.catch_up()
+        self.ledger.checkpoint()
+        if self.analytics:
+            self.analytics.checkpoint()
+        self.forecast.refresh()
+
+    def stats(self):
+        return {
+            "items": self.items.stats(),
+            "sales": self.ledger.stats(),
+            "writer": self.writer.stats(),
+            "analytics": self.analytics.stats() if self.analytics else None,
+            "archive": self.archive.stats(),
+            "forecast": self.forecast.stats()
+        }
+
+class Branches:
+    """Every branch: main in the working directory, the others in root/<id>/.
+
+    A branch exists once its directory does, whichever process created it;
+    its stores are only built on first use. Work spanning all branches runs
+    on a small thread pool, one task per branch.
+    """
+
+    # Upper bound on threads used by map(); file reads and fsyncs release the GIL
+    POOL_SIZE = 8
+
+    def __init__(self, root="branches", **options):
+        self.root = root
+        self.options = options
+        self._branches = {MAIN: Branch(MAIN, "", **options)}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def ids(self):
+        try:
+            found = [name for name in os.listdir(self.root) if BRANCH_ID.match(name) and name != MAIN
+                     and os.path.isdir(os.path.join(self.root, name))]
+        except FileNotFoundError:
+            found = []
+        return [MAIN] + sorted(found)
+
+    def get(self, id):
+        """The branch called id, or None if there is no such branch."""
+        branch = self._branches.get(id)
+        if branch is not None:
+            return branch
+        if not BRANCH_ID.match(id) or not os.path.isdir(os.path.join(self.root, id)):
+            return None
+        with self._lock:
+            branch = self._branches.get(id)
+            if branch is None:
+                branch = self._branches[id] = Branch(id, os.path.join(self.root, id), **self.options)
+        return branch
+
+    def create(self, id):
+        """Make a new, empty branch. Returns it, or None if id is taken or not a valid name."""
+        if id == MAIN or not BRANCH_ID.match(id):
+            return None
+        try:
+            os.makedirs(os.path.join(self.root, id))
+        except FileExistsError:
+            return None
+        return self.get(id)
+
+    def all(self):
+        return [branch for branch in map(self.get, self.ids()) if branch is not None]
+
+    def _executor(self):
+        # Pool threads do not survive a fork, so each worker makes its own
+        if self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(self.POOL_SIZE, thread_name_prefix="branches")
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def map(self, fn, branches=None):
+        """[(branch, fn(branch))] for every branch, run concurrently."""
+        branches = self.all() if branches is None else branches
+        if len(branches) == 1:
+            return [(branches[0], fn(branches[0]))]
+        return list(zip(branches, self._executor().map(fn, branches)))
+
+def split_branch(path):
+    """(branch id, rest of the path) for /b/<id>/..., or (None, path) for any other path."""
+    if not path.startswith("/b/"):
+        return None, path
+    id, _, rest = path[3:].partition("/")
+    return id, "/" + rest
+
+class BranchPrefix:
+    """WSGI middleware routing /b/<id>/... to the app with the branch set.
+
+    The prefix moves from PATH_INFO to SCRIPT_NAME, so url_for() keeps links
+    within the branch. Requests without one may name it in an X-Branch header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        id, rest = split_branch(environ.get("PATH_INFO", ""))
+        if id is not None:
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/b/" + id
+            environ["PATH_INFO"] = rest
+            environ["inventory.branch"] = id
+        return self.app(environ, start_response)
@@ -0,0 +1,61 @@
+import csv
+import os
+import threading
+
+from metrics import timed
+from search import NameIndex
+from store import stat_stamp
+
+class MedicineCatalog:
+    """Reference list of medicine names from a CSV file, indexed for prefix lookups.
+
+    The name is the second column; the first row is a header. The file is
+    only re-read when its mtime or size changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._names = {}
+        self._index = NameIndex(substring=False)
+        self._stamp = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @timed("parse_medicines")
+    def _read(self):
+        names = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)  # Skip header
+                for row in reader:
+                    if len(row) > 1 and row[1].strip():
+                        name = row[1].strip()
+                        names.setdefault(name.casefold(), name)
+        except FileNotFoundError:
+            pass
+        return names
+
+    def _refresh(self):
+        stamp = stat_stamp(self.path)
+        if self._loaded and stamp == self._stamp:
+            return
+        names = self._read()
+        self._names = names
+        self._index = NameIndex(names, substring=False)
+        self._stamp = stamp
+        self._loaded = True
+
+    def names(self):
+        with self._lock:
+            self._refresh()
+            return [self._names[key] for key in self._index.keys]
+
+    def suggest(self, query, limit=10):
+        """Up to limit names starting with query, in alphabetical order."""
+        with self._lock:
+            self._refresh()
+            return [self._names[key] for key in self._index.prefix(query.casefold(), limit)]
+
+    def stats(self):
+        return {"pid": os.getpid(), "medicines": len(self._names)}
@@ -0,0 +1,73 @@
+import csv
+import io
+
+from records import Batch
+from store import checked_expiry, clean_lot
+
+ITEM_COLUMNS = ["name", "stock", "buy", "sell", "expiry", "lot", "reorder_level"]
+SALE_COLUMNS = ["date", "name", "qty", "profit", "revenue"]
+
+def csv_line(values):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)
+    return buf.getvalue()
+
+def parse_item_row(row):
+    name = (row.get("name") or "").strip()
+    if not name or "," in name:
+        raise ValueError("name is required and can't contain commas")
+    item = {
+        "name": name,
+        "stock": int(row.get("stock") or 0),
+        "original_price": float(row["buy"]),
+        "sale_price": float(row["sell"]),
+        "expiry": checked_expiry(row.get("expiry")),
+        "lot": clean_lot(row.get("lot"))
+    }
+    if item["stock"] < 0:
+        raise ValueError("stock can't be negative")
+    if row.get("reorder_level"):
+        item["reorder_level"] = int(row["reorder_level"])
+    return item
+
+def read_items_csv(stream):
+    """Parse an uploaded items CSV row by row. Returns (items, errors).
+
+    The first row is a header naming at least name, buy and sell.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    items = []
+    errors = []
+    # The header and the rows are decoded lazily, so either can fail to decode or parse
+    try:
+        missing = {"name", "buy", "sell"} - set(reader.fieldnames or [])
+        if missing:
+            return [], [f"Missing column(s): {', '.join(sorted(missing))}"]
+        for row in reader:
+            try:
+                items.append(parse_item_row(row))
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"Line {reader.line_num}: {e}")
+    except UnicodeDecodeError:
+        errors.append("File is not UTF-8 text; save it as UTF-8 CSV")
+    except csv.Error as e:
+        # line_num counts the lines read before the one that failed
+        errors.append(f"Line {reader.line_num + 1}: {e}")
+    return items, errors
+
+def item_rows(items):
+    """CSV text for items, one row per batch, in the format read_items_csv accepts."""
+    yield csv_line(ITEM_COLUMNS)
+    for item in items:
+        batches = item.batch_list() or [Batch("", item.expiry, 0)]
+        for batch in batches:
+            yield csv_line([
+                item.name, batch.qty, item.original_price, item.sale_price,
+                batch.expiry, batch.lot, item.reorder_level
+            ])
+
+def sale_rows(sales):
+    """CSV text for an iterable of sales, one row at a time."""
+    yield csv_line(SALE_COLUMNS)
+    for sale in sales:
+        yield csv_line([getattr(sale, c) for c in SALE_COLUMNS])
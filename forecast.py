@@ -0,0 +1,214 @@
+import json
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from metrics import timed
+from store import is_low, stat_stamp
+
+class ReorderForecast:
+    """Sales velocity per item, days until each runs out, and what to order.
+
+    Velocity is an exponentially smoothed count of units sold per day over
+    the ledger's daily rollups (span_days sets how fast old days fade). Only
+    complete days are counted, and each refresh folds in just the days
+    finished since the last one, so its cost follows the new sales rather
+    than the history. An item is due for ordering once its stock would not
+    last the lead time plus safety days; the suggested quantity brings it up
+    to cover those and cover_days more. Items with no sales history fall
+    back to their reorder level, and are left out unless below it.
+
+    The smoothing state and the latest forecast are saved to path. Every
+    worker reads the forecast from there, and whichever refreshes next
+    carries on from the saved state; an flock on path + ".lock" keeps two
+    from computing at once.
+    """
+
+    CACHE_VERSION = 1
+
+    def __init__(self, path, ledger, items, span_days=28, lead_days=7, safety_days=3, cover_days=14, max_age=300):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.ledger = ledger
+        self.items = items
+        self.alpha = 2 / (span_days + 1)
+        self.lead_days = lead_days
+        self.safety_days = safety_days
+        self.cover_days = cover_days
+        self.max_age = max_age
+        self.runs = 0
+        self.folded_days = 0
+        self._cached = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def cached(self):
+        """The last saved forecast, or None before the first refresh."""
+        with self._lock:
+            stamp = stat_stamp(self.path)
+            if stamp != self._stamp:
+                try:
+                    with open(self.path, "r") as f:
+                        data = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    data = None
+                self._cached = data if data and data.get("version") == self.CACHE_VERSION else None
+                self._stamp = stamp
+            return self._cached
+
+    def version(self):
+        return stat_stamp(self.path)
+
+    def _stale(self, data, yesterday):
+        return (
+            data is None
+            or data["through"] < yesterday
+            or time.time() - data["computed_at"] >= self.max_age
+        )
+
+    def refresh(self, force=False):
+        """Bring the forecast up to date if it is due and no other process is at it. Returns it."""
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        data = self.cached()
+        if not force and not self._stale(data, yesterday):
+            return data
+        with open(self.lock_path, "a") as lock:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return data
+            # Another process may have finished a refresh while we waited for our turn
+            data = self.cached()
+            if not force and not self._stale(data, yesterday):
+                return data
+            data = self._compute(data, yesterday)
+            self._save(data)
+        return self.cached()
+
+    def _fold(self, velocity, after, through):
+        """Fold the ledger's days in (after, through] into velocity, {name: [value, last day, first day]}."""
+        keep = 1 - self.alpha
+        days = self.ledger.item_days(after, through)
+        for day, sold in days:
+            d = date.fromisoformat(day).toordinal()
+            for name, qty in sold.items():
+                state = velocity.get(name)
+                if state is None:
+                    velocity[name] = [self.alpha * qty, d, d]
+                    continue
+                # Days without sales since the last one only decay the average
+                state[0] = state[0] * keep ** (d - state[1]) + self.alpha * qty
+                state[1] = d
+        self.folded_days += len(days)
+
+    def _velocity(self, state, today):
+        value, last, first = state
+        keep = 1 - self.alpha
+        # Smoothing starts from zero; dividing out the missing weight keeps new items from reading low
+        seen = today - first + 1
+        return value * keep ** (today - last) / (1 - keep ** seen)
+
+    @timed("forecast_reorders")
+    def _compute(self, data, yesterday):
+        inode = self.ledger.version()[0]
+        if data is None or data.get("inode") != inode:
+            # A replaced sales file may not hold the same days; start from the whole rollup
+            velocity, after = {}, None
+        else:
+            # A copy, so a run that fails part way leaves the saved state as it was
+            velocity = {name: list(state) for name, state in data["velocity"].items()}
+            after = data["through"]
+        self._fold(velocity, after, yesterday)
+        end = date.fromisoformat(yesterday).toordinal()
+
+        rows = []
+        for item in self.items.load():
+            state = velocity.get(item.name)
+            rate = self._velocity(state, end) if state else 0.0
+            if rate > 0:
+                days_left = item.stock / rate
+                due = days_left <= self.lead_days + self.safety_days
+                quantity = math.ceil(rate * (self.lead_days + self.safety_days + self.cover_days) - item.stock)
+            else:
+                days_left = None
+                due = is_low(item)
+                quantity = item.reorder_level - item.stock
+                if not due:
+                    continue
+            rows.append({
+                "name": item.name,
+                "stock": item.stock,
+                "velocity": round(rate, 3),
+                "days_left": round(days_left, 1) if days_left is not None else None,
+                "order": max(quantity, 0) if due else 0
+            })
+        rows.sort(key=lambda r: (r["days_left"] is None, r["days_left"] or 0, r["name"]))
+        self.runs += 1
+        return {
+            "version": self.CACHE_VERSION,
+            "computed_at": time.time(),
+            "through": yesterday,
+            "inode": inode,
+            "items": rows,
+            "velocity": velocity
+        }
+
+    def _save(self, data):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def purchase_order(self, data=None):
+        """The lines of the cached forecast with something to order, soonest out first."""
+        data = data or self.cached()
+        return [row for row in data["items"] if row["order"] > 0] if data else []
+
+    def stats(self):
+        data = self.cached()
+        return {
+            "pid": os.getpid(), "runs": self.runs, "folded_days": self.folded_days,
+            "through": data["through"] if data else None,
+            "computed_at": datetime.fromtimestamp(data["computed_at"]).isoformat(timespec="seconds") if data else None
+        }
+
+class BackgroundJob:
+    """Runs fn every interval seconds on a daemon thread, one per process.
+
+    start() is cheap to call on every request; a forked worker, which does
+    not inherit the thread, starts its own on its first call.
+    """
+
+    def __init__(self, fn, interval, name="background-job"):
+        self.fn = fn
+        self.interval = interval
+        self.name = name
+        self.failures = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                self.fn()
+            except Exception:
+                # The next run tries again; readers keep the last good result meanwhile
+                self.failures += 1
+            time.sleep(self.interval)
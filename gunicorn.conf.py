@@ -0,0 +1,17 @@
+import gc
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:81")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+# Threaded workers keep connections open between requests, so a till's JSON calls
+# skip the TCP handshake; sync workers close the connection after every response
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+keepalive = 5
+# Build the item, sales and medicine indexes once in the master; workers fork with them loaded
+preload_app = True
+
+def when_ready(server):
+    from app import warm_up
+    warm_up()
+    # Keep the collector from touching (and so copying) the inherited objects in every worker
+    gc.freeze()
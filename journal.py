@@ -0,0 +1,194 @@
+import bisect
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
+from metrics import timed
+from store import fsync_dir
+from writer import APPEND_FLAGS, drop_torn_tail, read_at
+
+SNAPSHOT_VERSION = 1
+KINDS = ("sale", "receipt", "adjustment", "delete")
+
+_sequence = itertools.count()
+
+def timestamp():
+    return datetime.now().isoformat(timespec="microseconds")
+
+# Snapshot file names carry their timestamp without the ':' Windows forbids in names
+NAME_TIME = "%Y%m%dT%H%M%S.%f"
+
+def snapshot_name(ts, offset):
+    return f"{datetime.fromisoformat(ts).strftime(NAME_TIME)}_{offset}.json"
+
+def parse_snapshot_name(name):
+    """(ts, offset) from a snapshot file name."""
+    stamp, _, offset = name[:-5].rpartition("_")
+    return datetime.strptime(stamp, NAME_TIME).isoformat(timespec="microseconds"), int(offset)
+
+def replay(state, moves):
+    """Apply movements to a {name: stock} dict. Each carries the item's stock after it."""
+    for move in moves:
+        if "from" in move:
+            state.pop(move["from"], None)
+        if move["kind"] == "delete":
+            state.pop(move["name"], None)
+        else:
+            state[move["name"]] = move["stock"]
+    return state
+
+class StockJournal:
+    """Append-only record of every stock movement, with snapshots for going back in time.
+
+    Each line is one movement as JSON: when, what kind (sale, receipt,
+    adjustment, delete), the item, the change in quantity and the stock it
+    left. Every SNAPSHOT_BYTES of journal, the stock of every item is written
+    to <path>.snapshots/ together with the journal offset it was taken at,
+    so stock_at() loads the nearest earlier snapshot and replays only the
+    lines after it.
+
+    The caller serialises writers; ItemStore appends under its flock.
+    """
+
+    SNAPSHOT_BYTES = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot_dir = path + ".snapshots"
+        self._snapshots = None
+        self._snapshots_stamp = None
+
+    def movement(self, kind, name, qty, stock, **extra):
+        """A new journal entry. qty is the change in stock, stock what it left."""
+        # The id lets a retried append skip what an interrupted one already wrote
+        return {"id": f"{time.time_ns():x}.{os.getpid()}.{next(_sequence)}", "ts": timestamp(), "kind": kind,
+                "name": name, "qty": qty, "stock": stock, **extra}
+
+    def snapshots(self):
+        """[(ts, offset, filename)] of every snapshot, oldest first."""
+        try:
+            stamp = os.stat(self.snapshot_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if stamp != self._snapshots_stamp:
+            found = []
+            for name in os.listdir(self.snapshot_dir):
+                if name.endswith(".json"):
+                    found.append((*parse_snapshot_name(name), name))
+            self._snapshots = sorted(found)
+            self._snapshots_stamp = stamp
+        return self._snapshots
+
+    def started(self):
+        # Snapshots are never removed, so once one is seen there is no need to look again
+        return bool(self._snapshots) or bool(self.snapshots())
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def snapshot(self, stock, offset, ts=None):
+        """Record stock ({name: qty}) as of journal offset."""
+        ts = ts or timestamp()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = os.path.join(self.snapshot_dir, snapshot_name(ts, offset))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "ts": ts, "offset": offset, "stock": stock}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        fsync_dir(path)
+
+    def _last_id(self, fd, size):
+        if not size:
+            return None
+        start = max(0, size - 64 * 1024)
+        tail = read_at(fd, size - start, start).rstrip(b"\n").rpartition(b"\n")[2]
+        try:
+            return json.loads(tail)["id"]
+        except (ValueError, KeyError):
+            return None
+
+    @timed("journal_stock")
+    def append(self, moves, stock):
+        """Append movements, then snapshot stock (the state after them) if one is due."""
+        if not moves and self.started():
+            return
+        fd = os.open(self.path, APPEND_FLAGS, 0o644)
+        try:
+            drop_torn_tail(fd)
+            size = os.fstat(fd).st_size
+            # A checkpoint that crashed after writing here left these in the items log too
+            ids = [move["id"] for move in moves]
+            last = self._last_id(fd, size)
+            if last in ids:
+                moves = moves[ids.index(last) + 1:]
+            if moves:
+                data = "".join(json.dumps(move) + "\n" for move in moves).encode("utf-8")
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                os.fsync(fd)
+                size += len(data)
+        finally:
+            os.close(fd)
+        snapshots = self.snapshots()
+        if not snapshots or size - snapshots[-1][1] >= self.SNAPSHOT_BYTES:
+            self.snapshot(stock, size, moves[-1]["ts"] if moves else None)
+
+    def _read(self, offset, until=None):
+        moves = []
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    move = json.loads(line)
+                    if until and move["ts"] > until:
+                        break
+                    moves.append(move)
+        except FileNotFoundError:
+            pass
+        return moves
+
+    def _nearest(self, ts):
+        snapshots = self.snapshots()
+        i = bisect.bisect_right(snapshots, (ts, float("inf"), ""))
+        return snapshots[i - 1] if i else None
+
+    @timed("rebuild_stock")
+    def stock_at(self, ts, pending=()):
+        """{name: stock} as it stood at ts, or None if ts is before the first snapshot.
+
+        pending are movements not yet appended here, which follow the journal.
+        """
+        nearest = self._nearest(ts)
+        if nearest is None:
+            return None
+        with open(os.path.join(self.snapshot_dir, nearest[2]), "r") as f:
+            state = json.load(f)["stock"]
+        moves = self._read(nearest[1], ts)
+        replay(state, moves)
+        replay(state, [move for move in pending if move["ts"] <= ts])
+        return state
+
+    def movements(self, name=None, start=None, end=None, pending=()):
+        """Movements between timestamps start and end, of one item if name is given.
+
+        Reading starts at the snapshot before start, not the top of the journal.
+        """
+        nearest = self._nearest(start) if start else None
+        moves = self._read(nearest[1] if nearest else 0, end)
+        moves.extend(move for move in pending if not end or move["ts"] <= end)
+        key = name.casefold() if name else None
+        return [
+            move for move in moves
+            if (not start or move["ts"] >= start)
+            and (key is None or move["name"].casefold() == key or move.get("from", "").casefold() == key)
+        ]
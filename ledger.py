@@ -0,0 +1,263 @@
+import bisect
+import marshal
+import os
+import sys
+import threading
+from datetime import date as date_cls
+
+from metrics import timed
+from records import Sale
+from store import gc_paused
+
+GROUPS = ("day", "week", "month", "quarter", "item")
+
+def parse_sale(line):
+    parts = line.strip().split(",")
+    # A sixth column is the sale's ref in the items log; older lines were written before revenue was recorded
+    if len(parts) == 6:
+        date, name, qty, profit, revenue, _ = parts
+    elif len(parts) == 5:
+        date, name, qty, profit, revenue = parts
+    elif len(parts) == 4:
+        date, name, qty, profit = parts
+        revenue = 0
+    else:
+        return None
+    return Sale(sys.intern(date), sys.intern(name), int(qty), float(profit), float(revenue))
+
+def format_sale(sale, ref=None):
+    line = f"{sale.date},{sale.name},{sale.qty},{sale.profit},{sale.revenue}"
+    return f"{line},{ref}\n" if ref is not None else line + "\n"
+
+def sale_ref(line):
+    """The items-log ref at the end of a sales line, or None for a line written without one."""
+    parts = line.strip().split(",")
+    try:
+        return int(parts[5]) if len(parts) == 6 else None
+    except ValueError:
+        return None
+
+def file_tail(f, offset):
+    # A few bytes before the offset, used to detect a file rewritten in place
+    start = max(0, offset - 64)
+    f.seek(start)
+    return f.read(offset - start).decode("utf-8", "replace")
+
+def group_key(day, group):
+    if group == "day":
+        return day
+    if group == "month":
+        return day[:7]
+    if group == "quarter":
+        return f"{day[:4]}-Q{(int(day[5:7]) - 1) // 3 + 1}"
+    year, week, _ = date_cls.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+class SalesLedger:
+    """Per-day rollup of an append-only sales file.
+
+    Only the bytes appended since the last refresh are parsed, so the cost of
+    a refresh depends on the new sales rather than the whole history. Each day
+    holds its totals plus [qty, profit, revenue] per item.
+    """
+
+    # The checkpoint is a marshal dump: it loads in about a third of the time
+    # JSON took, and a Python upgrade that can't read it just means a rebuild
+    CHECKPOINT_VERSION = 5
+
+    # Rewrite the checkpoint at most once per this many newly read bytes
+    CHECKPOINT_EVERY = 64 * 1024
+
+    def __init__(self, path, checkpoint_path=None, archive=None):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.archive = archive
+        self.offset = 0
+        self.last_ref = 0
+        self.days = {}
+        self._dates = []
+        self._inode = None
+        self._archived_through = ""
+        self._checkpointed_at = 0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def _reset(self, inode=None):
+        self.offset = 0
+        self.last_ref = 0
+        self.days = {}
+        self._dates = []
+        self._inode = inode
+        self._archived_through = ""
+        self._checkpointed_at = 0
+
+    def _load_archive(self):
+        # Archived months come from the partition headers; the hot file holds the rest
+        if not self.archive:
+            return
+        self._archived_through = self.archive.compacted_through()
+        self.days.update(self.archive.days())
+        self._dates = sorted(self.days)
+
+    def _add(self, sale):
+        day = self.days.get(sale.date)
+        if day is None:
+            day = self.days[sale.date] = {"profit": 0.0, "qty": 0, "revenue": 0.0, "items": {}}
+            bisect.insort(self._dates, sale.date)
+        day["profit"] += sale.profit
+        day["qty"] += sale.qty
+        day["revenue"] += sale.revenue
+        totals = day["items"].get(sale.name)
+        if totals is None:
+            totals = day["items"][sale.name] = [0, 0.0, 0.0]
+        totals[0] += sale.qty
+        totals[1] += sale.profit
+        totals[2] += sale.revenue
+
+    def _load_checkpoint(self, st):
+        try:
+            with open(self.checkpoint_path, "rb") as f, gc_paused():
+                data = marshal.load(f)
+        except (FileNotFoundError, EOFError, ValueError, TypeError):
+            return
+        if not isinstance(data, dict) or data.get("version") != self.CHECKPOINT_VERSION:
+            return
+        if data.get("inode") != st.st_ino or data.get("offset", 0) > st.st_size:
+            return
+        with open(self.path, "rb") as f:
+            if file_tail(f, data["offset"]) != data.get("tail"):
+                return
+        self.offset = data["offset"]
+        self.last_ref = data.get("last_ref", 0)
+        self.days = data["days"]
+        self._dates = sorted(self.days)
+        self._inode = st.st_ino
+        self._archived_through = data.get("archived_through", "")
+        self._checkpointed_at = self.offset
+
+    @timed("checkpoint_sales")
+    def _save_checkpoint(self):
+        with open(self.path, "rb") as f:
+            tail = file_tail(f, self.offset)
+        tmp = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump({"version": self.CHECKPOINT_VERSION, "inode": self._inode, "offset": self.offset, "tail": tail,
+                          "last_ref": self.last_ref, "archived_through": self._archived_through, "days": self.days}, f)
+        os.replace(tmp, self.checkpoint_path)
+        self._checkpointed_at = self.offset
+
+    @timed("refresh_sales")
+    def refresh(self):
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return
+            if not self._started:
+                self._started = True
+                if self.checkpoint_path:
+                    self._load_checkpoint(st)
+            if st.st_ino != self._inode or st.st_size < self.offset:
+                # Replaced (as compaction does) or truncated: start over from the beginning
+                self._reset(st.st_ino)
+                self._load_archive()
+            if st.st_size == self.offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(st.st_size - self.offset)
+            # Leave a half-written last line for the next refresh
+            end = data.rfind(b"\n") + 1
+            lines = data[:end].decode("utf-8").splitlines()
+            with gc_paused():
+                for line in lines:
+                    sale = parse_sale(line)
+                    # Lines up to the archived date are already counted from a partition
+                    if sale and sale.date > self._archived_through:
+                        self._add(sale)
+            # The writer appends in ref order, so the newest ref is on the last line that has one
+            for line in reversed(lines):
+                ref = sale_ref(line)
+                if ref is not None:
+                    self.last_ref = ref
+                    break
+            self.offset += end
+            if self.checkpoint_path and self.offset - self._checkpointed_at >= self.CHECKPOINT_EVERY:
+                self._save_checkpoint()
+
+    def checkpoint(self):
+        """Save the rollup now if it has moved on since the last checkpoint."""
+        self.refresh()
+        with self._lock:
+            if self.checkpoint_path and self._inode is not None and self.offset != self._checkpointed_at:
+                self._save_checkpoint()
+
+    def version(self):
+        self.refresh()
+        with self._lock:
+            return (self._inode, self.offset)
+
+    @timed("read_day")
+    def day(self, date, pending=()):
+        """Profit and per-item quantity sold on one date.
+
+        pending is [(ref, sale)] from the items log. Those past the last ref
+        in the file are counted too, so a sale shows before the writer has
+        copied it over.
+        """
+        self.refresh()
+        with self._lock:
+            day = self.days.get(date)
+            profit = day["profit"] if day else 0.0
+            qty = {name: t[0] for name, t in day["items"].items()} if day else {}
+            for ref, sale in pending:
+                if ref > self.last_ref and sale.date == date:
+                    profit += sale.profit
+                    qty[sale.name] = qty.get(sale.name, 0) + sale.qty
+            return {"profit": profit, "qty": qty}
+
+    def item_days(self, after=None, through=None):
+        """[(date, {name: qty})] for each day with sales in (after, through], oldest first."""
+        self.refresh()
+        with self._lock:
+            lo = bisect.bisect_right(self._dates, after) if after else 0
+            hi = bisect.bisect_right(self._dates, through) if through else len(self._dates)
+            return [
+                (date, {name: t[0] for name, t in self.days[date]["items"].items()})
+                for date in self._dates[lo:hi]
+            ]
+
+    @timed("report_sales")
+    def report(self, start=None, end=None, group="day"):
+        """Totals for the dates in [start, end], grouped by day/week/month/quarter/item.
+
+        Only the rolled-up days in range are visited, never the sales file itself.
+        """
+        self.refresh()
+        with self._lock:
+            lo = bisect.bisect_left(self._dates, start) if start else 0
+            hi = bisect.bisect_right(self._dates, end) if end else len(self._dates)
+            rows = {}
+            totals = {"profit": 0.0, "qty": 0, "revenue": 0.0}
+            for date in self._dates[lo:hi]:
+                day = self.days[date]
+                totals["profit"] += day["profit"]
+                totals["qty"] += day["qty"]
+                totals["revenue"] += day["revenue"]
+                if group == "item":
+                    for name, (qty, profit, revenue) in day["items"].items():
+                        row = rows.setdefault(name, {"key": name, "profit": 0.0, "qty": 0, "revenue": 0.0})
+                        row["profit"] += profit
+                        row["qty"] += qty
+                        row["revenue"] += revenue
+                else:
+                    key = group_key(date, group)
+                    row = rows.setdefault(key, {"key": key, "profit": 0.0, "qty": 0, "revenue": 0.0})
+                    row["profit"] += day["profit"]
+                    row["qty"] += day["qty"]
+                    row["revenue"] += day["revenue"]
+        return {"totals": totals, "rows": list(rows.values())}
+
+    def stats(self):
+        return {"pid": os.getpid(), "offset": self.offset, "days": len(self.days)}
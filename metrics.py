@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import parse_qs
+
+from flask import before_render_template, g, request, template_rendered
+from werkzeug.middleware.profiler import ProfilerMiddleware
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def label_text(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f"{n}=\"{v}\"" for n, v in zip(names, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{label_text(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus text format."""
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                total = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    total += count
+                    lines.append(f"{self.name}_bucket{label_text(self.labels + ('le',), key + (bound,))} {total}")
+                lines.append(f"{self.name}_bucket{label_text(self.labels + ('le',), key + ('+Inf',))} {series['count']}")
+                lines.append(f"{self.name}_sum{label_text(self.labels, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{label_text(self.labels, key)} {series['count']}")
+        return lines
+
+OPERATIONS = Histogram("inventory_operation_seconds", "Time spent in data loading and saving operations.", ("op",))
+OPERATION_ERRORS = Counter("inventory_operation_errors_total", "Operations that raised an exception.", ("op",))
+TEMPLATES = Histogram("inventory_template_render_seconds", "Time spent rendering templates.", ("template",))
+REQUESTS = Histogram("inventory_request_seconds", "Request latency by endpoint.", ("endpoint", "method", "status"))
+REGISTRY = (OPERATIONS, OPERATION_ERRORS, TEMPLATES, REQUESTS)
+
+def timed(op):
+    """Decorator recording the call's duration under op, and a count of failures."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                OPERATION_ERRORS.inc(op=op)
+                raise
+            finally:
+                OPERATIONS.observe(time.perf_counter() - started, op=op)
+        return wrapper
+    return decorate
+
+def render():
+    """All metrics of this process. Each gunicorn worker keeps its own."""
+    lines = [f"# pid {os.getpid()}"]
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+_rendering = threading.local()
+
+def _template_started(app, template, context, **extra):
+    _rendering.__dict__.setdefault("stack", []).append(time.perf_counter())
+
+def _template_done(app, template, context, **extra):
+    stack = getattr(_rendering, "stack", None)
+    if stack:
+        TEMPLATES.observe(time.perf_counter() - stack.pop(), template=template.name)
+
+def _request_started():
+    g.metrics_started = time.perf_counter()
+
+def _request_done(response):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        REQUESTS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or "unmatched",
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+def instrument(app):
+    """Time every request and template render of a Flask app."""
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_done, app)
+    app.before_request(_request_started)
+    app.after_request(_request_done)
+
+class ProfileOnRequest:
+    """WSGI middleware running cProfile for requests that ask for it.
+
+    A request with an X-Profile: 1 header or a profile=1 query argument has
+    its stats printed to stderr, sorted by cumulative time, and dumped as a
+    .prof file into profile_dir when one is given. Every other request goes
+    straight to the app.
+    """
+
+    def __init__(self, app, profile_dir=None, restrictions=(40,)):
+        self.app = app
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        self.profiler = ProfilerMiddleware(
+            app, stream=sys.stderr, sort_by=("cumulative", "calls"), restrictions=restrictions, profile_dir=profile_dir
+        )
+
+    def __call__(self, environ, start_response):
+        flag = environ.get("HTTP_X_PROFILE") or parse_qs(environ.get("QUERY_STRING", "")).get("profile", [""])[0]
+        if flag in ("1", "true", "yes"):
+            return self.profiler(environ, start_response)
+        return self.app(environ, start_response)
@@ -0,0 +1,134 @@
+import sys
+from array import array
+from dataclasses import asdict, dataclass, fields
+from datetime import date
+
+# Items without their own reorder level count as low stock below this
+DEFAULT_REORDER_LEVEL = 10
+
+@dataclass(slots=True)
+class Batch:
+    lot: str
+    expiry: str
+    qty: int
+
+@dataclass(slots=True)
+class Item:
+    name: str
+    stock: int
+    original_price: float
+    sale_price: float
+    expiry: str = ""
+    reorder_level: int = DEFAULT_REORDER_LEVEL
+    # None for the usual single unnamed batch, which stock and expiry describe; see batch_list()
+    batches: list = None
+    # Raised by every change, for clients making conditional updates
+    version: int = 0
+
+    def copy(self):
+        batches = None if self.batches is None else [Batch(b.lot, b.expiry, b.qty) for b in self.batches]
+        return Item(
+            self.name, self.stock, self.original_price, self.sale_price, self.expiry, self.reorder_level, batches,
+            self.version
+        )
+
+    def assign(self, other):
+        """Take on another item's values, keeping this object's identity."""
+        for f in fields(self):
+            setattr(self, f.name, getattr(other, f.name))
+
+    def batch_list(self):
+        """The batches as a list, built from stock and expiry when there is just the one."""
+        if self.batches is not None:
+            return self.batches
+        return [Batch("", self.expiry, self.stock)] if self.stock > 0 else []
+
+    def to_dict(self):
+        data = asdict(self)
+        data["batches"] = [asdict(b) for b in self.batch_list()]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        batches = data.get("batches")
+        return cls(
+            sys.intern(data["name"]),
+            data["stock"],
+            data["original_price"],
+            data["sale_price"],
+            data.get("expiry", ""),
+            data.get("reorder_level", DEFAULT_REORDER_LEVEL),
+            None if batches is None else [Batch(**b) for b in batches],
+            data.get("version", 0)
+        )
+
+@dataclass(slots=True)
+class Sale:
+    date: str
+    name: str
+    qty: int
+    profit: float
+    revenue: float = 0.0
+
+class SalesTable:
+    """Sales held column by column in typed arrays.
+
+    Dates are stored as ordinals and names as indexes into a shared list, so
+    a row costs a few dozen bytes instead of a dict's several hundred. Rows
+    come back out as Sale objects.
+    """
+
+    def __init__(self):
+        self.dates = array("l")
+        self.name_ids = array("l")
+        self.qty = array("l")
+        self.profit = array("d")
+        self.revenue = array("d")
+        self.names = []
+        self._name_ids = {}
+        self._date_cache = {}
+
+    @classmethod
+    def from_columns(cls, names, dates, name_ids, qty, profit, revenue):
+        table = cls()
+        table.names = [sys.intern(name) for name in names]
+        table._name_ids = {name: i for i, name in enumerate(table.names)}
+        table.dates = array("l", dates)
+        table.name_ids = array("l", name_ids)
+        table.qty = array("l", qty)
+        table.profit = array("d", profit)
+        table.revenue = array("d", revenue)
+        return table
+
+    def _name_id(self, name):
+        i = self._name_ids.get(name)
+        if i is None:
+            i = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def append(self, sale):
+        ordinal = self._date_cache.get(sale.date)
+        if ordinal is None:
+            ordinal = self._date_cache[sale.date] = date.fromisoformat(sale.date).toordinal()
+        self.dates.append(ordinal)
+        self.name_ids.append(self._name_id(sale.name))
+        self.qty.append(sale.qty)
+        self.profit.append(sale.profit)
+        self.revenue.append(sale.revenue)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, i):
+        return Sale(
+            date.fromordinal(self.dates[i]).isoformat(),
+            self.names[self.name_ids[i]],
+            self.qty[i],
+            self.profit[i],
+            self.revenue[i]
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
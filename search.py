@@ -0,0 +1,62 @@
+import bisect
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class NameIndex:
+    """Sorted keys for prefix lookups plus a trigram index for substring lookups.
+
+    Keys are expected to be case-folded already. Queries shorter than three
+    characters have no trigram to look up and are checked against every key.
+    Pass substring=False to keep only the sorted keys.
+    """
+
+    def __init__(self, keys=(), substring=True):
+        self.keys = sorted(set(keys))
+        self.grams = {}
+        self.substring = substring
+        for key in self.keys:
+            self._index(key)
+
+    def _index(self, key):
+        if not self.substring:
+            return
+        for gram in trigrams(key):
+            self.grams.setdefault(gram, set()).add(key)
+
+    def add(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return
+        self.keys.insert(i, key)
+        self._index(key)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return
+        del self.keys[i]
+        for gram in trigrams(key):
+            bucket = self.grams.get(gram)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.grams[gram]
+
+    def prefix(self, query, limit=None):
+        lo = bisect.bisect_left(self.keys, query)
+        hi = bisect.bisect_left(self.keys, query + "\U0010ffff")
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return self.keys[lo:hi]
+
+    def search(self, query):
+        """Keys containing query, in sorted order."""
+        if not query:
+            return self.keys
+        if len(query) < 3:
+            return [k for k in self.keys if query in k]
+        # Start from the rarest trigram and only check the survivors
+        buckets = sorted((self.grams.get(g, ()) for g in trigrams(query)), key=len)
+        candidates = buckets[0]
+        return sorted(k for k in candidates if query in k)
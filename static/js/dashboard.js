@@ -0,0 +1,287 @@
+function showSection(id) {
+    document.querySelectorAll('.toggle-section').forEach(function(sec) {
+        sec.classList.remove('active');
+    });
+    document.querySelectorAll('.toggle-btn').forEach(function(btn) {
+        btn.classList.remove('active');
+    });
+    document.querySelectorAll('.tabbar-btn').forEach(function(btn) {
+        btn.classList.remove('active');
+    });
+    document.getElementById(id).classList.add('active');
+    var btn = document.getElementById('btn-' + id);
+    if (btn) btn.classList.add('active');
+    var tabBtn = document.getElementById('tab-' + id);
+    if (tabBtn) tabBtn.classList.add('active');
+}
+
+// Pages of a branch live under /b/<id>; the server puts that prefix on <body>
+function appUrl(path) {
+    return (document.body.dataset.base || '') + path;
+}
+
+var INVENTORY_PAGE_SIZE = 25;
+var inventoryState = { q: '', offset: 0, total: 0 };
+// Sale prices of items seen in search results, keyed by lower-cased name
+var knownPrices = {};
+
+function debounce(fn, wait) {
+    var timer;
+    return function() {
+        var self = this, args = arguments;
+        clearTimeout(timer);
+        timer = setTimeout(function() { fn.apply(self, args); }, wait);
+    };
+}
+
+function fetchItems(params) {
+    var query = Object.keys(params).map(function(k) {
+        return encodeURIComponent(k) + '=' + encodeURIComponent(params[k]);
+    }).join('&');
+    return fetch(appUrl('/api/items?' + query)).then(function(r) { return r.json(); }).then(function(data) {
+        data.items.forEach(function(item) {
+            knownPrices[item.name.toLowerCase()] = item.sale_price;
+        });
+        return data;
+    });
+}
+
+function cell(text, align) {
+    var td = document.createElement('td');
+    td.textContent = text;
+    if (align) td.style.textAlign = align;
+    return td;
+}
+
+function actionsCell(name) {
+    var td = document.createElement('td');
+    td.style.textAlign = 'center';
+    var form = document.createElement('form');
+    form.action = appUrl('/delete/' + encodeURIComponent(name));
+    form.method = 'post';
+    form.style.display = 'inline';
+    form.innerHTML = '<button type="submit" class="delete-btn">Delete</button>';
+    var link = document.createElement('a');
+    link.href = appUrl('/edit/' + encodeURIComponent(name));
+    link.innerHTML = '<button type="button" class="edit-btn">Edit</button>';
+    td.appendChild(form);
+    td.appendChild(link);
+    return td;
+}
+
+function loadInventory() {
+    fetchItems({ q: inventoryState.q, offset: inventoryState.offset, limit: INVENTORY_PAGE_SIZE }).then(function(data) {
+        var body = document.querySelector('#inventory-table tbody');
+        body.innerHTML = '';
+        data.items.forEach(function(item) {
+            var row = document.createElement('tr');
+            row.appendChild(cell(item.name));
+            row.appendChild(cell(item.stock, 'right'));
+            row.appendChild(cell('MMK' + Math.trunc(item.original_price), 'right'));
+            row.appendChild(cell('MMK' + Math.trunc(item.sale_price), 'right'));
+            row.appendChild(actionsCell(item.name));
+            body.appendChild(row);
+        });
+        inventoryState.total = data.total;
+        document.getElementById('inventory-empty').style.display = data.total ? 'none' : '';
+        var end = Math.min(data.offset + data.items.length, data.total);
+        document.getElementById('inventory-range').textContent = data.total ? (data.offset + 1) + '-' + end + ' of ' + data.total : '';
+        document.getElementById('inventory-prev').disabled = data.offset === 0;
+        document.getElementById('inventory-next').disabled = end >= data.total;
+    });
+}
+
+// Fill the shared item datalist with matches for whatever is being typed
+var suggestItems = debounce(function(input) {
+    fetchItems({ q: input.value, limit: 20 }).then(function(data) {
+        var list = document.getElementById('item-options');
+        list.innerHTML = '';
+        data.items.forEach(function(item) {
+            var option = document.createElement('option');
+            option.value = item.name;
+            option.label = item.name + ' (Stock: ' + item.stock + ')';
+            list.appendChild(option);
+        });
+        updateTotalPrice();
+    });
+}, 200);
+
+var suggestMedicines = debounce(function(input) {
+    if (!input.value) return;
+    fetch(appUrl('/api/medicines/suggest?q=' + encodeURIComponent(input.value))).then(function(r) {
+        return r.json();
+    }).then(function(data) {
+        var list = document.getElementById('medicine-options');
+        list.innerHTML = '';
+        data.suggestions.forEach(function(name) {
+            var option = document.createElement('option');
+            option.value = name;
+            list.appendChild(option);
+        });
+    });
+}, 200);
+
+function notifyLowStock(message) {
+    if (message && "Notification" in window && Notification.permission === "granted") {
+        new Notification("Low Stock Alert", { body: message });
+    }
+}
+
+// Low-stock items by name, as pushed by the server
+var lowStock = {};
+
+// As many names as the server-rendered banner shows; the rest are counted and linked
+var LOW_STOCK_SHOWN = 20;
+
+function renderLowStock() {
+    var alert = document.getElementById('low-stock-alert');
+    var list = document.getElementById('low-stock-list');
+    var names = Object.keys(lowStock).sort();
+    var shown = names.slice(0, LOW_STOCK_SHOWN);
+    list.innerHTML = '';
+    shown.forEach(function(name, i) {
+        var span = document.createElement('span');
+        span.textContent = name + ' (' + lowStock[name].stock + ' left)';
+        list.appendChild(span);
+        if (i < shown.length - 1) list.appendChild(document.createTextNode(', '));
+    });
+    if (names.length > shown.length) {
+        var more = document.createElement('a');
+        more.href = appUrl('/api/alerts/low-stock');
+        more.textContent = '+' + (names.length - shown.length) + ' more';
+        list.appendChild(document.createTextNode(' '));
+        list.appendChild(more);
+    }
+    alert.style.display = names.length ? '' : 'none';
+}
+
+// Without data-stream on the alert, each open tab would hold a server thread; poll instead
+var LOW_STOCK_POLL_MS = 30000;
+
+function pollLowStock(notify) {
+    fetch(appUrl('/api/alerts/low-stock')).then(function(r) {
+        return r.json();
+    }).then(function(data) {
+        var previous = lowStock;
+        lowStock = {};
+        data.items.forEach(function(item) {
+            if (notify && !previous[item.name]) notifyLowStock(item.name + ' (' + item.stock + ' left)');
+            lowStock[item.name] = item;
+        });
+        renderLowStock();
+    }).finally(function() {
+        setTimeout(function() { pollLowStock(true); }, LOW_STOCK_POLL_MS);
+    });
+}
+
+function watchLowStock() {
+    if (!window.EventSource || !document.getElementById('low-stock-alert').hasAttribute('data-stream')) {
+        pollLowStock(false);
+        return;
+    }
+    var source = new EventSource(appUrl('/api/alerts/low-stock/stream'));
+    source.addEventListener('snapshot', function(e) {
+        lowStock = {};
+        JSON.parse(e.data).items.forEach(function(item) { lowStock[item.name] = item; });
+        renderLowStock();
+    });
+    source.addEventListener('change', function(e) {
+        var change = JSON.parse(e.data);
+        if (change.low) {
+            if (!lowStock[change.name]) notifyLowStock(change.name + ' (' + change.stock + ' left)');
+            lowStock[change.name] = change;
+        } else {
+            delete lowStock[change.name];
+        }
+        renderLowStock();
+    });
+}
+
+function updateTotalPrice() {
+    var select = document.getElementById('sell-name');
+    var qtyInput = document.getElementById('qty');
+    var totalDiv = document.getElementById('total-price');
+    if (!select || !qtyInput || !totalDiv) return;
+    var qty = parseInt(qtyInput.value) || 0;
+    var price = knownPrices[select.value.toLowerCase()] || 0;
+    var total = qty * price;
+    totalDiv.innerText = 'MMK' + total;
+}
+
+function addBasketLine() {
+    var lines = document.getElementById('basket-lines');
+    var line = lines.querySelector('.basket-line').cloneNode(true);
+    line.querySelectorAll('input').forEach(function(input) { input.value = ''; });
+    lines.appendChild(line);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    showSection('inventory');
+
+    document.getElementById('inventory-search').addEventListener('input', debounce(function() {
+        inventoryState.q = this.value;
+        inventoryState.offset = 0;
+        loadInventory();
+    }, 200));
+
+    document.getElementById('import-form').addEventListener('submit', function(e) {
+        e.preventDefault();
+        var result = document.getElementById('import-result');
+        result.textContent = 'Importing...';
+        fetch(appUrl('/api/items/import'), { method: 'POST', body: new FormData(this) }).then(function(r) {
+            return r.json();
+        }).then(function(data) {
+            if (data.errors) {
+                result.textContent = 'Nothing imported:\n' + data.errors.join('\n');
+            } else {
+                result.textContent = 'Imported ' + data.rows + ' rows (' + data.created + ' new, ' + data.updated + ' restocked).';
+                loadInventory();
+            }
+        });
+    });
+    document.getElementById('inventory-prev').addEventListener('click', function() {
+        inventoryState.offset = Math.max(0, inventoryState.offset - INVENTORY_PAGE_SIZE);
+        loadInventory();
+    });
+    document.getElementById('inventory-next').addEventListener('click', function() {
+        inventoryState.offset += INVENTORY_PAGE_SIZE;
+        loadInventory();
+    });
+    loadInventory();
+
+    // Sale and basket pickers search the server as the user types
+    document.addEventListener('input', function(e) {
+        if (e.target.id === 'sell-name' || e.target.classList.contains('item-picker')) {
+            suggestItems(e.target);
+        } else if (e.target.id === 'name') {
+            suggestMedicines(e.target);
+        }
+    });
+
+    // Tab bar activation
+    document.querySelectorAll('.tabbar-btn').forEach(function(btn) {
+        btn.addEventListener('click', function() {
+            document.querySelectorAll('.tabbar-btn').forEach(function(b) {
+                b.classList.remove('active');
+            });
+            btn.classList.add('active');
+        });
+    });
+    // Always update price on load and on input
+    var select = document.getElementById('sell-name');
+    var qtyInput = document.getElementById('qty');
+    if (select) select.addEventListener('input', updateTotalPrice);
+    if (qtyInput) {
+        qtyInput.addEventListener('input', updateTotalPrice);
+        qtyInput.addEventListener('change', updateTotalPrice);
+    }
+    updateTotalPrice();
+
+    // Request notification permission on page load
+    if ("Notification" in window && Notification.permission !== "granted") {
+        Notification.requestPermission();
+    }
+    // If there are low stock items, show a notification
+    notifyLowStock(document.getElementById('low-stock-alert').getAttribute('data-message'));
+    watchLowStock();
+});
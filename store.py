@@ -0,0 +1,878 @@
+import bisect
+import gc
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import date, timedelta
+
+from metrics import timed
+from records import DEFAULT_REORDER_LEVEL, Batch, Item, Sale
+from search import NameIndex
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; threads are still serialised
+    fcntl = None
+
+def parse_item(line):
+    parts = line.strip().split(",")
+    batches = ""
+    reorder_level = DEFAULT_REORDER_LEVEL
+    version = 0
+    # Support old files without expiry, and rows without batch, reorder-level or version columns
+    if len(parts) == 8:
+        name, stock, original_price, sale_price, expiry, batches, reorder_level, version = parts
+    elif len(parts) == 7:
+        name, stock, original_price, sale_price, expiry, batches, reorder_level = parts
+    elif len(parts) == 6:
+        name, stock, original_price, sale_price, expiry, batches = parts
+    elif len(parts) == 5:
+        name, stock, original_price, sale_price, expiry = parts
+    else:
+        name, stock, original_price, sale_price = parts
+        expiry = ""
+    item = Item(
+        sys.intern(name),
+        int(stock),
+        float(original_price),
+        float(sale_price),
+        expiry,
+        int(reorder_level) if reorder_level != "" else DEFAULT_REORDER_LEVEL,
+        [parse_batch(b) for b in batches.split(";")] if batches else None,
+        int(version)
+    )
+    return normalise_batches(item)
+
+def format_item(item):
+    row = f"{item.name},{item.stock},{item.original_price},{item.sale_price},{item.expiry}"
+    batches = item.batch_list()
+    # A single unnamed batch is fully described by stock and expiry
+    lots = len(batches) > 1 or (batches and batches[0].lot)
+    # Optional columns are left empty at their defaults, and dropped from the end when empty
+    extra = [
+        ";".join(f"{b.lot}|{b.expiry}|{b.qty}" for b in batches) if lots else "",
+        str(item.reorder_level) if item.reorder_level != DEFAULT_REORDER_LEVEL else "",
+        str(item.version) if item.version else ""
+    ]
+    while extra and not extra[-1]:
+        extra.pop()
+    if extra:
+        row += "," + ",".join(extra)
+    return row + "\n"
+
+def checked_expiry(value):
+    """value as a YYYY-MM-DD expiry date, or "" for none. Raises ValueError.
+
+    Anything else could carry the separators format_item writes between
+    batches and fields.
+    """
+    value = (value or "").strip()
+    if value and (len(value) != 10 or date.fromisoformat(value).isoformat() != value):
+        raise ValueError(f"expiry {value!r} is not a YYYY-MM-DD date")
+    return value
+
+def clean_lot(value):
+    """A lot number with the separators format_item writes taken out."""
+    return re.sub(r"[,;|]", "", str(value or "")).strip()
+
+def parse_batch(text):
+    lot, expiry, qty = text.split("|")
+    return Batch(lot, expiry, int(qty))
+
+def parse_expiry(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+def expiry_order(batch):
+    # ISO dates sort as strings; batches without an expiry go last
+    return batch.expiry or "9999-12-31"
+
+def is_low(item):
+    return item.stock < item.reorder_level
+
+def normalise_batches(item):
+    """Keep stock and expiry in step with the batches, and drop the list when stock and expiry say it all.
+
+    Most items hold one unnamed batch, and a list plus a Batch for each
+    would cost every one of them; only a second batch or a lot number
+    needs them.
+    """
+    if item.batches is None:
+        return item
+    item.batches.sort(key=expiry_order)
+    item.stock = sum(b.qty for b in item.batches)
+    if item.batches:
+        item.expiry = item.batches[0].expiry
+    if not item.batches or (len(item.batches) == 1 and not item.batches[0].lot):
+        item.batches = None
+    return item
+
+def receive(batches, qty, expiry="", lot=""):
+    for batch in batches:
+        if batch.lot == lot and batch.expiry == expiry:
+            batch.qty += qty
+            return
+    batches.append(Batch(lot, expiry, qty))
+    batches.sort(key=expiry_order)
+
+def draw(batches, qty):
+    """Take qty from the earliest-expiring batches first. Returns the [(lot, expiry, qty)] drawn."""
+    drawn = []
+    while qty > 0 and batches:
+        batch = batches[0]
+        take = min(qty, batch.qty)
+        batch.qty -= take
+        qty -= take
+        drawn.append((batch.lot, batch.expiry, take))
+        if batch.qty <= 0:
+            batches.pop(0)
+    return drawn
+
+def merged(existing, fields):
+    """New Item for receiving the stock in fields into existing (or creating it when existing is None).
+
+    fields is a dict of Item fields, plus an optional "lot" for the batch.
+    """
+    if existing:
+        new = existing.copy()
+        new.original_price = fields["original_price"]
+        new.sale_price = fields["sale_price"]
+        if "reorder_level" in fields:
+            new.reorder_level = fields["reorder_level"]
+    else:
+        new = Item(
+            sys.intern(fields["name"]),
+            0,
+            fields["original_price"],
+            fields["sale_price"],
+            fields.get("expiry", ""),
+            fields.get("reorder_level", DEFAULT_REORDER_LEVEL)
+        )
+    if fields["stock"] > 0:
+        new.batches = new.batch_list()
+        receive(new.batches, fields["stock"], fields.get("expiry", ""), fields.get("lot", ""))
+    return normalise_batches(new)
+
+def updated(item, fields):
+    """New Item with fields set on item.
+
+    A new stock level is reached by receiving the difference (with the
+    given expiry) or drawing it first-expiry-first-out, unless explicit
+    batches are given. Raises ValueError for a new expiry on an item with
+    several batches, unless stock is being received at that date.
+    """
+    new = item.copy()
+    # Taken before the new stock and expiry are set, which a single batch is built from
+    batches = new.batch_list()
+    for field, value in fields.items():
+        setattr(new, field, value)
+    if "batches" not in fields:
+        new.batches = batches
+        expiry = fields.get("expiry", "")
+        current = sum(b.qty for b in batches)
+        if len(batches) == 1 and "expiry" in fields:
+            batches[0].expiry = expiry
+        elif "expiry" in fields and expiry != item.expiry and fields.get("stock", 0) <= current:
+            # There is no one expiry to change; a new date only applies to stock being received
+            raise ValueError(f"{item.name} has {len(batches)} batches, each with its own expiry date")
+        if "stock" in fields:
+            if fields["stock"] > current:
+                receive(batches, fields["stock"] - current, expiry)
+            elif fields["stock"] < current:
+                draw(batches, current - fields["stock"])
+    return normalise_batches(new)
+
+def sold(item, qty):
+    new = item.copy()
+    new.batches = new.batch_list()
+    draw(new.batches, qty)
+    return normalise_batches(new)
+
+_gc_pauses = 0
+_gc_pause_lock = threading.Lock()
+_gc_was_enabled = False
+
+@contextmanager
+def gc_paused():
+    """Hold off cyclic garbage collection while building large structures.
+
+    Loading a big file allocates millions of objects, and every few thousand
+    allocations the collector rescans them all; none of them are garbage
+    yet. Nested and concurrent uses are counted, so the collector comes back
+    on only after the last one ends.
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_pause_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_pause_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+def stat_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def fsync_dir(path):
+    # Make a rename durable; not supported on every platform
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class ItemStore:
+    """Process-level copy of an items file backed by a write-ahead log.
+
+    items.txt is a snapshot that is only ever replaced atomically
+    (temp file + fsync + rename). Every change is first appended and fsynced
+    to <path>.wal as the full new row of the item it touches, so replaying the
+    log is idempotent and a crash during a checkpoint cannot double-apply a
+    sale. Other processes' changes are picked up by replaying only the log
+    bytes appended since the last look.
+
+    Each item holds its stock as batches (lot, expiry, qty) kept in expiry
+    order, so sales draw first-expiry-first-out from the front of the list.
+    A sorted (expiry date, name, lot) index answers near-expiry queries with
+    a bisect.
+
+    The set of items below their reorder level is kept up to date as changes
+    are applied (including ones replayed from other processes), and each
+    change to it is numbered and kept in a short event log for live clients.
+
+    Writers take an exclusive flock on <path>.lock for the whole
+    check-and-change, so several gunicorn workers never decrement the same
+    stale stock.
+
+    With a journal, each log record also carries the stock movements it
+    makes (sale, receipt, adjustment or delete). They cost no extra write
+    on the way in, and are handed to the journal when the log is folded
+    into the snapshot.
+
+    A sale's record also carries the sale itself, with a ref that rises in
+    log order, so stock and sale are made durable together. on_checkpoint
+    is handed the log's sales before the log is dropped and must see them
+    written to the sales file; the log then keeps only the last ref, so
+    refs go on rising after it.
+    """
+
+    # Fold the log back into the snapshot once it grows past this size
+    CHECKPOINT_BYTES = 256 * 1024
+    # Low-stock changes kept for clients catching up; older ones need a resync
+    ALERT_HISTORY = 1000
+
+    def __init__(self, path, journal=None, on_checkpoint=None):
+        self.path = path
+        self.journal = journal
+        self.on_checkpoint = on_checkpoint
+        self.wal_path = path + ".wal"
+        self.lock_path = path + ".lock"
+        self.hits = 0
+        self.misses = 0
+        self._items = []
+        self._index = {}
+        self._names = NameIndex()
+        self._expiry = []
+        self._low = set()
+        # Movements in the log that the journal does not have yet
+        self._moves = []
+        # [(ref, sale)] in the log, in ref order
+        self._sales = []
+        self._last_ref = 0
+        self._alerts = deque(maxlen=self.ALERT_HISTORY)
+        self._alert_seq = 0
+        self._snap_stamp = None
+        self._wal_stamp = None
+        self._wal_offset = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._alert_changed = threading.Condition(self._lock)
+        self._lock_depth = 0
+        self._lock_file = None
+        self._lock_pid = None
+
+    @contextmanager
+    def locked(self):
+        """Hold the store exclusively, across threads and processes. Re-entrant."""
+        with self._lock:
+            if self._lock_depth == 0 and fcntl:
+                # flock is per open file, so a file inherited across fork
+                # would not exclude the parent; reopen in each process
+                if self._lock_pid != os.getpid():
+                    self._lock_file = open(self.lock_path, "a")
+                    self._lock_pid = os.getpid()
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @timed("parse_items")
+    def _read(self):
+        items = []
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        items.append(parse_item(line))
+        except FileNotFoundError:
+            pass
+        return items
+
+    def _reindex(self):
+        # First row wins for duplicate names, matching the old linear scans
+        self._index = {}
+        for item in self._items:
+            self._index.setdefault(item.name.casefold(), item)
+        self._names = NameIndex(self._index)
+        self._expiry = []
+        for key, item in self._index.items():
+            self._expiry.extend(self._expiry_entries(key, item))
+        self._expiry.sort()
+        low = {key for key, item in self._index.items() if is_low(item)}
+        if low != self._low:
+            self._low = low
+            # Too much may have changed to describe; clients start over
+            self._alert({"reset": True})
+
+    def _alert(self, event):
+        self._alert_seq += 1
+        self._alerts.append({"seq": self._alert_seq, **event})
+        self._alert_changed.notify_all()
+
+    def _track_low(self, key, item, was_low, old_stock):
+        now_low = item is not None and is_low(item)
+        if now_low:
+            self._low.add(key)
+        else:
+            self._low.discard(key)
+        # Entering or leaving the set, or a change of stock while in it
+        if was_low != now_low or (now_low and item.stock != old_stock):
+            self._alert({
+                "name": item.name if item else key,
+                "low": now_low,
+                "stock": item.stock if item else 0,
+                "reorder_level": item.reorder_level if item else None
+            })
+
+    def _expiry_entries(self, key, item):
+        for batch in item.batch_list():
+            when = parse_expiry(batch.expiry)
+            if when and batch.qty > 0:
+                yield (when, key, batch.lot)
+
+    def _index_expiry(self, key, item):
+        for entry in self._expiry_entries(key, item):
+            bisect.insort(self._expiry, entry)
+
+    def _unindex_expiry(self, key, item):
+        for entry in self._expiry_entries(key, item):
+            i = bisect.bisect_left(self._expiry, entry)
+            if i < len(self._expiry) and self._expiry[i] == entry:
+                del self._expiry[i]
+
+    def _apply(self, record):
+        self._moves.extend(record.get("moves", ()))
+        for ref, sale in record.get("sales", ()):
+            self._sales.append((ref, Sale(**sale) if isinstance(sale, dict) else sale))
+            self._last_ref = max(self._last_ref, ref)
+        if record["op"] == "mark":
+            self._last_ref = max(self._last_ref, record["ref"])
+            return
+        if record["op"] == "batch":
+            for sub in record["records"]:
+                self._apply(sub)
+            return
+        if record["op"] == "del":
+            key = record["name"].casefold()
+            existing = self._index.pop(key, None)
+            if existing is not None:
+                self._items = [i for i in self._items if i.name.casefold() != key]
+                self._names.remove(key)
+                self._unindex_expiry(key, existing)
+                self._track_low(key, None, key in self._low, existing.stock)
+            return
+        item = record["item"]
+        if isinstance(item, dict):
+            item = normalise_batches(Item.from_dict(item))
+        old_key = record["from"].casefold()
+        existing = self._index.pop(old_key, None)
+        if existing is None:
+            old_key = item.name.casefold()
+            existing = self._index.pop(old_key, None)
+        key = item.name.casefold()
+        if existing is None:
+            existing = item
+            self._items.append(existing)
+            was_low, old_stock = False, None
+        else:
+            self._names.remove(old_key)
+            self._unindex_expiry(old_key, existing)
+            was_low, old_stock = old_key in self._low, existing.stock
+            if old_key != key:
+                # A rename leaves the set under the old name
+                self._track_low(old_key, None, was_low, old_stock)
+                was_low = False
+            existing.assign(item)
+        self._index[key] = existing
+        self._names.add(key)
+        self._index_expiry(key, existing)
+        self._track_low(key, existing, was_low, old_stock)
+
+    @timed("replay_items_log")
+    def _replay(self):
+        try:
+            with open(self.wal_path, "rb") as f:
+                f.seek(self._wal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        for line in data.splitlines(keepends=True):
+            # A torn last line from a crashed writer ends the log
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self._apply(record)
+            self._wal_offset += len(line)
+
+    def _refresh(self):
+        snap = stat_stamp(self.path)
+        wal = stat_stamp(self.wal_path)
+        if self._loaded and snap == self._snap_stamp and wal == self._wal_stamp:
+            self.hits += 1
+            return
+        self.misses += 1
+        same_log = wal and self._wal_stamp and wal[2] == self._wal_stamp[2] and wal[1] >= self._wal_offset
+        if not (self._loaded and snap == self._snap_stamp and same_log):
+            with gc_paused():
+                self._items = self._read()
+                self._reindex()
+            self._wal_offset = 0
+            self._moves = []
+            self._sales = []
+        self._replay()
+        self._snap_stamp = snap
+        self._wal_stamp = wal
+        self._loaded = True
+
+    def _movements(self, record, kind):
+        """Journal entries for the stock changes record is about to make."""
+        kind = record.get("kind", kind)
+        if record["op"] == "batch":
+            return [move for sub in record["records"] for move in self._movements(sub, kind)]
+        if record["op"] == "del":
+            item = self._index.get(record["name"].casefold())
+            return [self.journal.movement("delete", item.name, -item.stock, 0)] if item else []
+        item = record["item"]
+        existing = self._index.get(record["from"].casefold()) or self._index.get(item.name.casefold())
+        old_stock = existing.stock if existing else 0
+        extra = {"from": existing.name} if existing and existing.name != item.name else {}
+        if item.stock == old_stock and not extra:
+            return []
+        return [self.journal.movement(kind, item.name, item.stock - old_stock, item.stock, **extra)]
+
+    def _raise_versions(self, record):
+        # Each put replaces an item one version on from the one it finds
+        if record["op"] == "batch":
+            for sub in record["records"]:
+                self._raise_versions(sub)
+        elif record["op"] == "put":
+            item = record["item"]
+            existing = self._index.get(record["from"].casefold()) or self._index.get(item.name.casefold())
+            item.version = (existing.version if existing else 0) + 1
+
+    def _stock(self):
+        return {item.name: item.stock for item in self._index.values()}
+
+    @timed("commit_item")
+    def _commit(self, record, kind, sales=()):
+        self._raise_versions(record)
+        if sales:
+            record["sales"] = []
+            for sale in sales:
+                # Nanoseconds keep refs distinct across processes; the log's last ref keeps them rising
+                self._last_ref = max(time.time_ns(), self._last_ref + 1)
+                record["sales"].append([self._last_ref, sale])
+        if self.journal:
+            if not self.journal.started():
+                # Everything before the first movement, for stock_at() to start from
+                self.journal.snapshot(self._stock(), self.journal.size())
+            moves = self._movements(record, kind)
+            if moves:
+                record["moves"] = moves
+        line = (json.dumps(record, default=asdict) + "\n").encode("utf-8")
+        with open(self.wal_path, "ab") as f:
+            if self._wal_stamp and self._wal_stamp[1] > self._wal_offset:
+                # Drop a torn tail so the new record starts on a clean line
+                f.truncate(self._wal_offset)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply(record)
+        self._wal_offset += len(line)
+        self._wal_stamp = stat_stamp(self.wal_path)
+        if self._wal_offset >= self.CHECKPOINT_BYTES:
+            self._checkpoint()
+
+    @timed("checkpoint_items")
+    def _checkpoint(self):
+        if self.journal:
+            # Journal first: if the rest is cut short, the log still holds these and the next try skips them
+            self.journal.append(self._moves, self._stock())
+        if self._sales and self.on_checkpoint:
+            # Likewise, sales the log holds are written out before it goes
+            self.on_checkpoint(list(self._sales))
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            for item in self._items:
+                f.write(format_item(item))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        fsync_dir(self.path)
+        # Replaying the old log over the new snapshot is harmless, so a crash
+        # before this truncate loses nothing
+        mark = (json.dumps({"op": "mark", "ref": self._last_ref}) + "\n").encode("utf-8") if self._last_ref else b""
+        with open(self.wal_path, "wb") as f:
+            f.write(mark)
+            f.flush()
+            os.fsync(f.fileno())
+        self._wal_offset = len(mark)
+        self._moves = []
+        self._sales = []
+        self._snap_stamp = stat_stamp(self.path)
+        self._wal_stamp = stat_stamp(self.wal_path)
+
+    def version(self):
+        """Changes whenever the snapshot or the log does."""
+        with self._lock:
+            self._refresh()
+            return (self._snap_stamp, self._wal_offset)
+
+    def load(self):
+        with self._lock:
+            self._refresh()
+            # Hand out a copy so callers can append/filter without touching the cache
+            return list(self._items)
+
+    def save(self, items):
+        with self.locked():
+            self._refresh()
+            items = [normalise_batches(i.copy()) for i in items]
+            if self.journal:
+                self._moves.extend(self._overwrite_movements(items))
+            self._items = items
+            self._reindex()
+            self._checkpoint()
+            self._loaded = True
+
+    def _overwrite_movements(self, items):
+        """Adjustments and deletes turning the current items into items."""
+        moves = []
+        kept = set()
+        for item in items:
+            key = item.name.casefold()
+            if key in kept:
+                continue
+            kept.add(key)
+            existing = self._index.get(key)
+            old_stock = existing.stock if existing else 0
+            if item.stock != old_stock:
+                moves.append(self.journal.movement("adjustment", item.name, item.stock - old_stock, item.stock))
+        for key, existing in self._index.items():
+            if key not in kept:
+                moves.append(self.journal.movement("delete", existing.name, -existing.stock, 0))
+        return moves
+
+    def stock_at(self, ts):
+        """{name: stock} at an ISO timestamp, rebuilt from the journal; None if before it began."""
+        with self._lock:
+            self._refresh()
+            pending = list(self._moves)
+        return self.journal.stock_at(ts, pending)
+
+    def movements(self, name=None, start=None, end=None):
+        """Journalled stock movements between two ISO timestamps, of one item if name is given."""
+        with self._lock:
+            self._refresh()
+            pending = list(self._moves)
+        return self.journal.movements(name, start, end, pending)
+
+    def get(self, name):
+        with self._lock:
+            self._refresh()
+            return self._index.get(name.casefold())
+
+    def search(self, query="", offset=0, limit=50, sort="name"):
+        """One page of items whose name contains query. Returns (total, items).
+
+        sort is name, stock or sale_price, with a leading "-" for descending.
+        """
+        with self._lock:
+            self._refresh()
+            keys = self._names.search(query.casefold())
+            field = sort.lstrip("-")
+            reverse = sort.startswith("-")
+            if field == "name":
+                # Keys are already in name order
+                if reverse:
+                    keys = keys[::-1]
+                matches = [self._index[k] for k in keys[offset:offset + limit]]
+            else:
+                matches = sorted((self._index[k] for k in keys), key=lambda i: getattr(i, field), reverse=reverse)
+                matches = matches[offset:offset + limit]
+            return len(keys), [i.copy() for i in matches]
+
+    def expiring(self, days, today=None):
+        """Batches in stock that expire within days of today (already-expired ones included)."""
+        today = today or date.today()
+        with self._lock:
+            self._refresh()
+            hi = bisect.bisect_right(self._expiry, (today + timedelta(days=days), "\U0010ffff"))
+            found = []
+            for when, key, lot in self._expiry[:hi]:
+                item = self._index[key]
+                qty = sum(b.qty for b in item.batch_list() if b.lot == lot and parse_expiry(b.expiry) == when)
+                found.append({
+                    "name": item.name,
+                    "lot": lot,
+                    "expiry": when.isoformat(),
+                    "qty": qty,
+                    "days_left": (when - today).days
+                })
+            return found
+
+    def low_stock(self):
+        """Items below their reorder level, by name, and the latest alert number."""
+        with self._lock:
+            self._refresh()
+            return [self._index[k].copy() for k in sorted(self._low)], self._alert_seq
+
+    def alerts_since(self, seq, timeout=None):
+        """Low-stock changes numbered after seq, waiting up to timeout for one.
+
+        Returns None when seq is too old (or from before a reload) to catch
+        up from, in which case the caller should start over from low_stock().
+        """
+        with self._lock:
+            self._refresh()
+            if seq == self._alert_seq and timeout:
+                # Other processes' writes don't notify us, so wake up and look
+                self._alert_changed.wait(timeout)
+                self._refresh()
+            if seq > self._alert_seq:
+                return None
+            events = [e for e in self._alerts if e["seq"] > seq]
+            if seq < self._alert_seq and (not events or events[0]["seq"] != seq + 1):
+                return None
+            if any(e.get("reset") for e in events):
+                return None
+            return events
+
+    def add(self, item):
+        """Add a new item, or receive it as a new batch of an existing item with the same name.
+
+        item is a dict of Item fields and may carry a "lot" for the batch
+        being received.
+        """
+        with self.locked():
+            self._refresh()
+            new = merged(self._index.get(item["name"].casefold()), item)
+            self._commit({"op": "put", "from": new.name, "item": new}, "receipt")
+            return self._index[new.name.casefold()]
+
+    def add_many(self, items):
+        """add() for many items as one log record. Returns (created, updated) counts."""
+        with self.locked():
+            self._refresh()
+            pending = {}
+            created = updated = 0
+            for item in items:
+                key = item["name"].casefold()
+                base = pending.get(key) or self._index.get(key)
+                if base is None:
+                    created += 1
+                elif key not in pending and key in self._index:
+                    updated += 1
+                pending[key] = merged(base, item)
+            if pending:
+                self._commit({"op": "batch", "records": [
+                    {"op": "put", "from": new.name, "item": new} for new in pending.values()
+                ]}, "receipt")
+            return created, updated
+
+    def update(self, name, fields):
+        """Update an item in place. Returns None if it does not exist or a rename would clash."""
+        with self.locked():
+            self._refresh()
+            key = name.casefold()
+            item = self._index.get(key)
+            if not item:
+                return None
+            new_key = fields.get("name", item.name).casefold()
+            if new_key != key and new_key in self._index:
+                return None
+            self._commit({"op": "put", "from": item.name, "item": updated(item, fields)}, "adjustment")
+            return item
+
+    def delete(self, name):
+        with self.locked():
+            self._refresh()
+            if name.casefold() not in self._index:
+                return False
+            self._commit({"op": "del", "name": name}, "delete")
+            return True
+
+    def take_stock(self, name, qty, sale=None):
+        """Draw stock first-expiry-first-out if enough is on hand.
+
+        sale(item, qty), if given, builds the Sale logged with the decrement.
+        Returns the item, or None if the sale can't go ahead.
+        """
+        with self.locked():
+            self._refresh()
+            item = self._index.get(name.casefold())
+            # A non-positive qty would draw nothing from the batches yet still log a sale
+            if not item or qty <= 0 or item.stock < qty:
+                return None
+            sales = [sale(item, qty)] if sale else ()
+            self._commit({"op": "put", "from": item.name, "item": sold(item, qty)}, "sale", sales)
+            return item
+
+    def take_stock_many(self, lines, sale=None):
+        """All-or-nothing decrement for several (name, qty) lines, logging sale(item, qty) for each if given.
+
+        Returns ([(item, qty), ...], []) with repeated names merged, or
+        (None, errors) without touching stock if any line can't be filled.
+        The whole basket is one log record, so a crash can't apply half of it.
+        """
+        with self.locked():
+            self._refresh()
+            wanted = {}
+            errors = []
+            for name, qty in lines:
+                item = self._index.get(name.casefold())
+                if not item:
+                    errors.append(f"Unknown item: {name}")
+                elif qty <= 0:
+                    errors.append(f"Quantity for {name} must be positive")
+                else:
+                    key = name.casefold()
+                    wanted[key] = wanted.get(key, 0) + qty
+            for key, qty in wanted.items():
+                item = self._index[key]
+                if item.stock < qty:
+                    errors.append(f"Not enough {item.name}: {item.stock} left, {qty} requested")
+            if errors or not wanted:
+                return None, errors or ["Basket is empty"]
+            records = []
+            sales = []
+            for key, qty in wanted.items():
+                item = self._index[key]
+                records.append({"op": "put", "from": item.name, "item": sold(item, qty)})
+                if sale:
+                    sales.append(sale(item, qty))
+            self._commit({"op": "batch", "records": records}, "sale", sales)
+            return [(self._index[key], qty) for key, qty in wanted.items()], []
+
+    def apply(self, operations):
+        """Several adds, updates and deletes as one log record, all or nothing.
+
+        Each operation is {"op": "add" | "update" | "delete", "name", "fields"},
+        optionally with the "version" the item must still be at (0 for one
+        that must not exist yet). An item may appear in only one operation.
+        Returns ([item, or None if deleted, per operation], []) or
+        (None, errors) without changing anything, each error being
+        {"index", "name", "reason", "error"} with reason missing, conflict,
+        exists or invalid.
+        """
+        with self.locked():
+            self._refresh()
+            records = []
+            results = []
+            errors = []
+            touched = set()
+            for i, operation in enumerate(operations):
+                op, name, fields = operation["op"], operation["name"], operation.get("fields", {})
+                key = name.casefold()
+                item = self._index.get(key)
+                expected = operation.get("version")
+                reason = error = None
+                if key in touched:
+                    reason, error = "conflict", f"{name} is in more than one operation"
+                elif expected is not None and (item.version if item else 0) != expected:
+                    reason, error = "conflict", f"{name} is at version {item.version if item else 0}, not {expected}"
+                elif op == "add":
+                    new = merged(item, {**fields, "name": name})
+                    records.append({"op": "put", "from": new.name, "item": new, "kind": "receipt"})
+                    results.append(key)
+                elif item is None:
+                    reason, error = "missing", f"Unknown item: {name}"
+                elif op == "delete":
+                    records.append({"op": "del", "name": item.name, "kind": "delete"})
+                    results.append(None)
+                else:
+                    new_key = fields.get("name", item.name).casefold()
+                    if new_key != key and (new_key in self._index or new_key in touched):
+                        reason, error = "exists", f"{fields['name']} already exists"
+                    else:
+                        try:
+                            records.append({"op": "put", "from": item.name, "item": updated(item, fields), "kind": "adjustment"})
+                            results.append(new_key)
+                            touched.add(new_key)
+                        except ValueError as e:
+                            reason, error = "invalid", str(e)
+                touched.add(key)
+                if reason:
+                    errors.append({"index": i, "name": name, "reason": reason, "error": error})
+            if errors:
+                return None, errors
+            if records:
+                self._commit({"op": "batch", "records": records}, "adjustment")
+            return [self._index[key].copy() if key else None for key in results], []
+
+    def pending_sales(self):
+        """[(ref, sale)] of every sale in the log, oldest first."""
+        with self._lock:
+            self._refresh()
+            return list(self._sales)
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self._items),
+            "wal_bytes": self._wal_offset,
+            "unjournalled_moves": len(self._moves),
+            "logged_sales": len(self._sales),
+        }
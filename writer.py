@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from ledger import format_sale, sale_ref
+from metrics import timed
+
+# Windows would otherwise open these in text mode and write \r\n
+APPEND_FLAGS = os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+
+def read_at(fd, size, offset):
+    """size bytes of fd from offset, like os.pread, which Windows lacks. Moves the fd's offset."""
+    os.lseek(fd, offset, os.SEEK_SET)
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def drop_torn_tail(fd):
+    """Cut a half-written last line off an append-only file. Returns the bytes removed."""
+    size = os.fstat(fd).st_size
+    if not size or read_at(fd, 1, size - 1) == b"\n":
+        return 0
+    start = max(0, size - 64 * 1024)
+    end = read_at(fd, size - start, start).rfind(b"\n") + 1
+    keep = start + end if end else start
+    os.ftruncate(fd, keep)
+    os.fsync(fd)
+    return size - keep
+
+def last_ref(fd):
+    """The ref of the last sales line that has one, or 0."""
+    size = os.fstat(fd).st_size
+    start = max(0, size - 64 * 1024)
+    for line in reversed(read_at(fd, size - start, start).decode("utf-8", "replace").splitlines()):
+        ref = sale_ref(line)
+        if ref is not None:
+            return ref
+    return 0
+
+class SalesWriter:
+    """Copies sales from the items log into the sales file from one background thread, with group commit.
+
+    A sale is first made durable in the same items-log record as the stock
+    it takes, with a ref that rises in log order. source() returns the
+    [(ref, sale)] the log holds, and each write appends the ones past the
+    last ref already in the file. Any process can write any other's sales,
+    the file stays in ref order, and nothing is written twice.
+
+    submit() returns a Future that resolves once everything committed to the
+    log before the call is written and fsynced. Whatever is submitted while
+    one batch is being synced goes out together in the next write, so
+    concurrent sellers share a single fsync. A positive flush_interval makes
+    the writer wait that long for more sales before writing a batch smaller
+    than batch_size. catch_up() does the same write at once, for a store
+    about to drop its log and for sales a crashed process left behind.
+
+    Before each write, a torn last line left by a process that crashed
+    mid-write is cut off so the batch starts on a clean line. Writers in
+    other processes are kept out meanwhile by an flock on path + ".lock".
+    """
+
+    def __init__(self, path, source, flush_interval=0.0, batch_size=256, on_commit=None):
+        self.path = path
+        self.source = source
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.on_commit = on_commit
+        self.batches = 0
+        self.written = 0
+        self.largest_batch = 0
+        self.recovered_bytes = 0
+        self.lock_path = path + ".lock"
+        self._pid = None
+        self._fd = None
+        self._lock_file = None
+        self._start_lock = threading.Lock()
+        # flock does not exclude threads sharing the lock file
+        self._write_lock = threading.Lock()
+
+    def _start(self):
+        # A forked worker inherits neither the thread nor a usable queue, so each pid starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pending = []
+            self._cond = threading.Condition()
+            self._fd = os.open(self.path, APPEND_FLAGS, 0o644)
+            self._lock_file = open(self.lock_path, "a")
+            threading.Thread(target=self._run, name="sales-writer", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _reopen_if_replaced(self):
+        # Compaction swaps in a new sales file; keep appending to the one at path
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self._fd).st_ino:
+            os.close(self._fd)
+            self._fd = os.open(self.path, APPEND_FLAGS, 0o644)
+
+    def submit(self, count=1):
+        """Have the log's sales written; count is how many the caller just added, for batch sizing."""
+        self._start()
+        future = Future()
+        with self._cond:
+            self._pending.append((count, future))
+            self._cond.notify()
+        return future
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            if self.flush_interval > 0:
+                deadline = time.monotonic() + self.flush_interval
+                while sum(n for n, _ in self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch, count = [], 0
+            while self._pending and (not batch or count + self._pending[0][0] <= self.batch_size):
+                entry = self._pending.pop(0)
+                batch.append(entry)
+                count += entry[0]
+            return batch, count
+
+    @timed("commit_sales")
+    def catch_up(self, entries=None):
+        """Write the entries (by default source()) past the file's last ref. Returns how many were written."""
+        self._start()
+        if entries is None:
+            entries = self.source()
+        with self._write_lock:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_replaced()
+                self.recovered_bytes += drop_torn_tail(self._fd)
+                last = last_ref(self._fd)
+                # Sales already moved to the archive come back with an empty hot file; readers skip their dates
+                data = "".join(format_sale(sale, ref) for ref, sale in entries if ref > last).encode("utf-8")
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view):]
+            finally:
+                if fcntl:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            os.fsync(self._fd)
+        written = data.count(b"\n")
+        if written:
+            self.batches += 1
+            self.written += written
+            self.largest_batch = max(self.largest_batch, written)
+            if self.on_commit:
+                try:
+                    self.on_commit()
+                except Exception:
+                    # The sales are on disk; readers catch up on their next refresh anyway
+                    pass
+        return written
+
+    def _run(self):
+        while True:
+            batch, _ = self._take_batch()
+            try:
+                self.catch_up()
+            except Exception as e:
+                # The sales stay in the items log; a later write or checkpoint copies them over
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for _, future in batch:
+                future.set_result(True)
+
+    def stats(self):
+        return {
+            "pid": os.getpid(), "batches": self.batches, "sales": self.written,
+            "largest_batch": self.largest_batch, "recovered_bytes": self.recovered_bytes
+        }